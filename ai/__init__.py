@@ -4,5 +4,6 @@ from ai.manager import AIManager
 from ai.clients.grok import GrokClient
 from ai.clients.perplexity import PerplexityClient
 from ai.exceptions import AIError
+from ai.search_cache import SearchCache
 
-__all__ = ['AIManager', 'GrokClient', 'PerplexityClient', 'AIError']
+__all__ = ['AIManager', 'GrokClient', 'PerplexityClient', 'AIError', 'SearchCache']
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import Hashable, List, Dict
+from ai.conversation import ConversationStore
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -8,7 +9,9 @@ logger = setup_logger(__name__)
 class BaseAIClient(ABC):
     """AI Clientの抽象基底クラス"""
 
-    MAX_HISTORY_LENGTH = 20  # クラス定数: 会話履歴の最大長
+    MAX_HISTORY_LENGTH = 20  # クラス定数: 1会話あたりの会話履歴の最大長
+    MAX_CONVERSATIONS = 500  # クラス定数: 同時に保持する会話（チャンネル）数の上限
+    CONVERSATION_IDLE_TIMEOUT = 3600  # クラス定数: この秒数使われなかった会話は破棄する
 
     # 共通システムプロンプト
     SYSTEM_PROMPT = (
@@ -27,8 +30,17 @@ class BaseAIClient(ABC):
         "| 名前 | 太郎 |"
     )
 
+    def __init__(self):
+        self.conversations = ConversationStore(
+            self.MAX_HISTORY_LENGTH,
+            max_conversations=self.MAX_CONVERSATIONS,
+            idle_timeout=self.CONVERSATION_IDLE_TIMEOUT,
+        )
+
     @abstractmethod
-    def send_message(self, message: str, image_url: str = None) -> str:
+    async def send_message(
+        self, message: str, image_url: str = None, conversation_key: Hashable = None
+    ) -> str:
         pass
 
     def _make_answer(self, user_msg: str, response: str) -> str:
@@ -36,13 +48,3 @@ class BaseAIClient(ABC):
         if len(response) > 2000:
             return response[:1997] + "..."
         return response
-
-    def prune_history(self) -> None:
-        """履歴が上限を超えたら最古のメッセージを削除"""
-        while len(self.chat_history) > self.MAX_HISTORY_LENGTH:
-            # 最古のペア(user + assistant)を削除
-            if len(self.chat_history) >= 2:
-                self.chat_history.pop(0)
-                self.chat_history.pop(0)
-            else:
-                break
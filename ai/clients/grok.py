@@ -1,5 +1,6 @@
 import os
-from openai import OpenAI
+from typing import AsyncIterator, Hashable
+from openai import AsyncOpenAI
 from ai.base_client import BaseAIClient
 from utils.logger import setup_logger
 
@@ -25,16 +26,15 @@ class GrokClient(BaseAIClient):
         provider = os.getenv('AI_PROVIDER', 'xai')
         self._tools = _XAI_TOOLS if provider == 'xai' else []
 
-        self.client = OpenAI(
+        self.client = AsyncOpenAI(
             api_key=api_key,
             base_url=base_url,
         )
 
-        self.chat_history = [
-            {"role": "system", "content": self.SYSTEM_PROMPT}
-        ] 
+        self._system_message = {"role": "system", "content": self.SYSTEM_PROMPT}
 
-    def send_message(self, input_message: str, image_url: str = None) -> str:
+    @staticmethod
+    def _user_message(input_message: str, image_url: str = None) -> dict:
         if image_url:
             content = [
                 {"type": "text", "text": input_message},
@@ -42,12 +42,23 @@ class GrokClient(BaseAIClient):
             ]
         else:
             content = input_message
-        self.chat_history.append({"role": "user", "content": content})
+        return {"role": "user", "content": content}
+
+    async def send_message(
+        self, input_message: str, image_url: str = None, conversation_key: Hashable = None
+    ) -> str:
+        """
+        conversation_keyごとに別々の会話履歴を使って応答を生成する。
+        (guild_id, channel_id)を渡せば、サーバーやチャンネルをまたいで文脈が混ざらない。
+        """
+        user_message = self._user_message(input_message, image_url)
+        conversation = self.conversations.get(conversation_key)
 
         try:
-            response = self.client.responses.create(
+            # 複数の呼び出しが並行するため、履歴には応答が得られた時点でまとめて追加する
+            response = await self.client.responses.create(
                 model=self.MODEL_NAME,
-                input=self.chat_history,
+                input=[self._system_message, *conversation.messages, user_message],
                 tools=self._tools,
                 temperature=self.TEMPERATURE,
                 max_output_tokens=self.MAX_TOKENS,
@@ -56,22 +67,52 @@ class GrokClient(BaseAIClient):
             logger.info(f"[GrokClient] model={self.MODEL_NAME}")
             response_message = response.output_text or "応答を生成できませんでした。"
 
-            self.chat_history.append({"role": "assistant", "content": response_message})
-            self.prune_history()
+            conversation.add_exchange(
+                user_message, {"role": "assistant", "content": response_message})
 
             return self._make_answer(input_message, response_message)
 
         except Exception as e:
             logger.error(f"[GrokClient] {type(e).__name__}: {str(e)}")
-            if self.chat_history and self.chat_history[-1].get("role") == "user":
-                self.chat_history.pop()
             raise
 
-    def prune_history(self) -> None:
-        while len(self.chat_history) > self.MAX_HISTORY_LENGTH + 1:
-            if len(self.chat_history) >= 3:
-                self.chat_history.pop(1)
-                if len(self.chat_history) > 2:
-                    self.chat_history.pop(1)
-            else:
-                break
+    async def stream_message(
+        self, input_message: str, image_url: str = None, conversation_key: Hashable = None
+    ) -> AsyncIterator[str]:
+        """
+        send_messageのストリーミング版。生成された応答テキストの差分を順にyieldする。
+        応答が最後まで得られた場合のみ会話履歴に追加する。
+        """
+        user_message = self._user_message(input_message, image_url)
+        conversation = self.conversations.get(conversation_key)
+
+        try:
+            stream = await self.client.responses.create(
+                model=self.MODEL_NAME,
+                input=[self._system_message, *conversation.messages, user_message],
+                tools=self._tools,
+                temperature=self.TEMPERATURE,
+                max_output_tokens=self.MAX_TOKENS,
+                stream=True,
+            )
+
+            logger.info(f"[GrokClient] model={self.MODEL_NAME} stream=True")
+            chunks = []
+            # 途中で打ち切られた（タイムアウト・キャンセル・送信エラー）場合もすぐにHTTP接続を返す
+            async with stream:
+                async for event in stream:
+                    if event.type == "response.output_text.delta" and event.delta:
+                        chunks.append(event.delta)
+                        yield event.delta
+
+            response_message = "".join(chunks)
+            if not response_message:
+                response_message = "応答を生成できませんでした。"
+                yield response_message
+
+            conversation.add_exchange(
+                user_message, {"role": "assistant", "content": response_message})
+
+        except Exception as e:
+            logger.error(f"[GrokClient] {type(e).__name__}: {str(e)}")
+            raise
@@ -1,5 +1,5 @@
 import os
-from openai import OpenAI
+from openai import AsyncOpenAI
 from typing import Dict, List
 from utils.logger import setup_logger
 
@@ -17,12 +17,12 @@ class PerplexityClient:
             raise ValueError("PERPLEXITY_API_KEY が環境変数に設定されていません")
 
         # Perplexity APIはOpenAI互換
-        self.client = OpenAI(
+        self.client = AsyncOpenAI(
             api_key=api_key,
             base_url="https://api.perplexity.ai"
         )
 
-    def search(self, query: str) -> Dict[str, any]:
+    async def search(self, query: str) -> Dict[str, any]:
         """
         Web検索を実行
 
@@ -36,7 +36,7 @@ class PerplexityClient:
             }
         """
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.MODEL_NAME,
                 messages=[
                     {
@@ -0,0 +1,71 @@
+"""会話履歴の管理
+
+会話はサーバー・チャンネル（スレッドを含む）ごとに分けて保持する。
+1会話の履歴は件数上限付きのdeque、会話の数はLRUで上限を設け、しばらく使われていない会話は破棄する。
+"""
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Hashable
+
+
+class Conversation:
+    """1つの会話の履歴（システムプロンプトを除く）"""
+
+    def __init__(self, max_messages: int):
+        # 上限を超えると最古のメッセージがO(1)で押し出される。
+        # 常にuser/assistantの組で追加するため、上限を偶数にしておけば組は崩れない
+        self.messages = deque(maxlen=max_messages)
+
+    def add_exchange(self, user_message: dict, assistant_message: dict) -> None:
+        self.messages.append(user_message)
+        self.messages.append(assistant_message)
+
+
+class ConversationStore:
+    """会話キー（(guild_id, channel_id)など）ごとの会話をLRUで保持する"""
+
+    def __init__(
+        self,
+        max_messages: int,
+        max_conversations: int = 500,
+        idle_timeout: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            max_messages: 1会話あたりに保持するメッセージ数
+            max_conversations: 同時に保持する会話数の上限。超えたら最も長く使われていない会話を破棄する
+            idle_timeout: この秒数使われなかった会話は破棄する
+        """
+        self.max_messages = max_messages
+        self.max_conversations = max_conversations
+        self.idle_timeout = idle_timeout
+        self._clock = clock
+        # 最後に使われた時刻順（先頭が最も古い）に並ぶ
+        self._conversations: OrderedDict[Hashable, tuple[Conversation, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._conversations
+
+    def get(self, key: Hashable) -> Conversation:
+        """会話を取得する。なければ新しく作る"""
+        now = self._clock()
+        self._evict_idle(now)
+
+        entry = self._conversations.pop(key, None)
+        conversation = entry[0] if entry else Conversation(self.max_messages)
+        self._conversations[key] = (conversation, now)
+
+        while len(self._conversations) > self.max_conversations:
+            self._conversations.popitem(last=False)
+        return conversation
+
+    def _evict_idle(self, now: float) -> None:
+        while self._conversations:
+            _, last_used = next(iter(self._conversations.values()))
+            if now - last_used < self.idle_timeout:
+                break
+            self._conversations.popitem(last=False)
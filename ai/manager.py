@@ -1,14 +1,55 @@
+import asyncio
 import os
+import time
+from contextlib import aclosing, asynccontextmanager
+from typing import AsyncIterator
 from ai.clients import GrokClient, PerplexityClient
 from ai.exceptions import AIError
+from utils import metrics
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+_REQUEST_SECONDS = metrics.histogram(
+    "ai_request_seconds", "AI API呼び出しの所要時間（同時実行数の枠の待ち時間を含む）", ["provider", "kind"])
+_FIRST_DELTA_SECONDS = metrics.histogram(
+    "ai_first_delta_seconds", "ストリーミングで最初の応答テキストが届くまでの時間", ["provider"])
+_REQUESTS = metrics.counter("ai_requests_total", "AI APIの呼び出し回数", ["provider", "kind", "status"])
+
+
+def _status(error: BaseException | None) -> str:
+    if error is None:
+        return "ok"
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    # stream_messageはタイムアウトもAIErrorに包んで送出する
+    if isinstance(error.__cause__ or error, (asyncio.TimeoutError, TimeoutError)):
+        return "timeout"
+    return "error"
+
+
+@asynccontextmanager
+async def _track(provider: str, kind: str):
+    """呼び出しの所要時間と結果を記録する"""
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _REQUEST_SECONDS.observe(time.perf_counter() - started, provider=provider, kind=kind)
+        _REQUESTS.inc(provider=provider, kind=kind, status=_status(error))
+
 
 class AIManager:
     """AI Client管理クラス"""
 
+    DEFAULT_MAX_CONCURRENCY = 8  # Bot全体で同時に実行するAPI呼び出し数
+    DEFAULT_MAX_CONCURRENCY_PER_GUILD = 2  # 1サーバーあたりで同時に実行するAPI呼び出し数
+    DEFAULT_TIMEOUT = 60.0  # 1回のAPI呼び出しのタイムアウト（秒）
+
     def __init__(self):
         self.grok_client = None
         self.perplexity_client = None
@@ -34,16 +75,107 @@ class AIManager:
                 logger.warning(f"Perplexity init failed: {e}")
                 self.perplexity_client = None
 
+        self.timeout = float(os.getenv('AI_TIMEOUT', self.DEFAULT_TIMEOUT))
+        self.max_concurrency_per_guild = int(
+            os.getenv('AI_MAX_CONCURRENCY_PER_GUILD', self.DEFAULT_MAX_CONCURRENCY_PER_GUILD))
+        self._global_semaphore = asyncio.Semaphore(
+            int(os.getenv('AI_MAX_CONCURRENCY', self.DEFAULT_MAX_CONCURRENCY)))
+        # サーバーごとの枠と、それを使用中・待機中の呼び出し数。誰も使っていないサーバーの枠は削除する
+        self._guild_semaphores: dict[int, asyncio.Semaphore] = {}
+        self._guild_users: dict[int, int] = {}
+        # 応答をストリーミングで受け取り、Discordのメッセージを逐次更新するか
+        self.streaming = os.getenv('AI_STREAMING', 'true').lower() == 'true'
+
         logger.info(f"AI clients: {', '.join(clients_enabled)}")
 
-    def send_message(self, message: str, image_url: str = None) -> str:
+    @asynccontextmanager
+    async def _slot(self, guild_id: int | None):
+        """サーバー単位・Bot全体の同時実行数の枠を確保する"""
+        if guild_id is None:
+            async with self._global_semaphore:
+                yield
+            return
+
+        semaphore = self._guild_semaphores.get(guild_id)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency_per_guild)
+            self._guild_semaphores[guild_id] = semaphore
+        self._guild_users[guild_id] = self._guild_users.get(guild_id, 0) + 1
+        try:
+            async with semaphore, self._global_semaphore:
+                yield
+        finally:
+            # 待機中の呼び出しがいる間は同じ枠を使い続け、最後の1つが抜けたら削除する（サーバー数に比例して増えない）
+            self._guild_users[guild_id] -= 1
+            if not self._guild_users[guild_id]:
+                del self._guild_users[guild_id]
+                del self._guild_semaphores[guild_id]
+
+    async def send_message(
+        self, message: str, image_url: str = None, guild_id: int = None, channel_id: int = None
+    ) -> str:
         """
+        会話履歴は(guild_id, channel_id)ごとに分けて保持される（スレッドはチャンネルIDで区別される）
+
         Raises:
-            AIError: API呼び出しが失敗した場合
+            AIError: API呼び出しが失敗した場合、またはタイムアウトした場合
         """
         try:
-            return self.grok_client.send_message(message, image_url=image_url)
+            async with _track("grok", "message"), self._slot(guild_id):
+                return await asyncio.wait_for(
+                    self.grok_client.send_message(
+                        message, image_url=image_url, conversation_key=(guild_id, channel_id)),
+                    timeout=self.timeout)
         except Exception as e:
             error_msg = f"Grok API failed. {type(e).__name__}: {str(e)}"
             logger.error(error_msg)
             raise AIError(error_msg) from e
+
+    async def stream_message(
+        self, message: str, image_url: str = None, guild_id: int = None, channel_id: int = None
+    ) -> AsyncIterator[str]:
+        """
+        send_messageのストリーミング版。応答テキストの差分を順にyieldする。
+        タイムアウトは次の差分が届くまでの待ち時間に対して適用する。
+
+        Raises:
+            AIError: API呼び出しが失敗した場合、またはタイムアウトした場合
+        """
+        started = time.perf_counter()
+        first_delta = True
+        async with _track("grok", "stream"), self._slot(guild_id):
+            stream = self.grok_client.stream_message(
+                message, image_url=image_url, conversation_key=(guild_id, channel_id))
+            async with aclosing(stream):
+                while True:
+                    try:
+                        delta = await asyncio.wait_for(anext(stream), timeout=self.timeout)
+                    except StopAsyncIteration:
+                        return
+                    except Exception as e:
+                        error_msg = f"Grok API failed. {type(e).__name__}: {str(e)}"
+                        logger.error(error_msg)
+                        raise AIError(error_msg) from e
+                    if first_delta:
+                        _FIRST_DELTA_SECONDS.observe(time.perf_counter() - started, provider="grok")
+                        first_delta = False
+                    yield delta
+
+    async def search(self, query: str, guild_id: int = None) -> dict:
+        """
+        PerplexityでWeb検索する
+
+        Raises:
+            AIError: Perplexityが利用できない場合、API呼び出しが失敗した場合、またはタイムアウトした場合
+        """
+        if not self.perplexity_client:
+            raise AIError("Perplexity client is not available")
+
+        try:
+            async with _track("perplexity", "search"), self._slot(guild_id):
+                return await asyncio.wait_for(
+                    self.perplexity_client.search(query), timeout=self.timeout)
+        except Exception as e:
+            error_msg = f"Perplexity API failed. {type(e).__name__}: {str(e)}"
+            logger.error(error_msg)
+            raise AIError(error_msg) from e
@@ -0,0 +1,108 @@
+"""
+/search の結果キャッシュ
+
+同じ質問で何度もPerplexity APIを呼ばないよう、正規化したクエリをキーに検索結果を保存する。
+メモリ上のLRUと、再起動後も残るSQLite（data/search_cache.db）の2段構成。
+"""
+import json
+import os
+import re
+import time
+import unicodedata
+from pathlib import Path
+
+from utils.logger import setup_logger
+from utils.sqlite import DatabaseManager
+from utils.ttl_cache import TTLCache
+
+logger = setup_logger(__name__)
+
+DB_PATH = Path(__file__).resolve().parent.parent / "data" / "search_cache.db"
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_query(query: str) -> str:
+    """全角・半角や大文字・小文字、空白の違いを吸収したキャッシュキーを返す"""
+    normalized = unicodedata.normalize("NFKC", query).lower()
+    return _WHITESPACE_RE.sub(" ", normalized).strip()
+
+
+class SearchCache:
+    """検索結果をメモリとSQLiteにTTL付きで保存するキャッシュ"""
+
+    DEFAULT_TTL = 3600  # 秒
+    DEFAULT_MEMORY_SIZE = 256
+
+    def __init__(
+        self,
+        db_path: Path = DB_PATH,
+        ttl: float | None = None,
+        memory_size: int | None = None,
+        databases: DatabaseManager | None = None,
+    ):
+        self.db_path = db_path
+        self.db = (databases or DatabaseManager()).get(db_path)
+        self.ttl = float(ttl if ttl is not None else os.getenv('SEARCH_CACHE_TTL', self.DEFAULT_TTL))
+        size = memory_size if memory_size is not None else self.DEFAULT_MEMORY_SIZE
+        # SQLiteに保存した有効期限と比較するため、メモリ側も実時刻で期限を管理する
+        self._memory = TTLCache(maxsize=size, ttl=self.ttl, clock=time.time)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    async def init(self) -> None:
+        async with self.db.transaction() as db:
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    query TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+            await db.execute("DELETE FROM search_cache WHERE expires_at <= ?", (time.time(),))
+
+    async def close(self) -> None:
+        await self.db.close()
+
+    async def get(self, query: str) -> dict | None:
+        """有効なキャッシュがあれば検索結果を返す。なければNone"""
+        key = normalize_query(query)
+        result = self._memory.get(key)
+        if result is None:
+            result = await self._get_persisted(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    async def _get_persisted(self, key: str) -> dict | None:
+        now = time.time()
+        async with self.db.read() as db:
+            cursor = await db.execute(
+                "SELECT result, expires_at FROM search_cache WHERE query = ? AND expires_at > ?",
+                (key, now),
+            )
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        result = json.loads(row[0])
+        self._memory.set(key, result, ttl=row[1] - now)
+        return result
+
+    async def set(self, query: str, result: dict) -> None:
+        key = normalize_query(query)
+        self._memory.set(key, result)
+        async with self.db.transaction() as db:
+            await db.execute(
+                "INSERT INTO search_cache (query, result, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (query) DO UPDATE SET result = excluded.result, expires_at = excluded.expires_at",
+                (key, json.dumps(result, ensure_ascii=False), time.time() + self.ttl),
+            )
@@ -1,29 +1,132 @@
-import requests
-import json
+import asyncio
+import os
+from collections import deque
+
+from utils.http_client import HttpClient, HttpError
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+DOG_API_URL = "https://dog.ceo/api/breeds/image/random"
+
 
 class API:
 
-    def getInfo(self, url):
+    def __init__(self, http: HttpClient | None = None):
+        self.http = http or HttpClient()
+
+    async def getInfo(self, url):
         try:
-            session = requests.Session()
-            response = session.get(url)
-            response.raise_for_status()     # ステータスコード200番台以外は例外とする
-        except requests.exceptions.RequestException as e:
+            return await self.http.get_json(url)
+        except HttpError as e:
             logger.error(f"[API] Request failed for {url}: {e}")
-            return
-        response.close()
-        logger.debug(f"[API] GET {url} -> {response.status_code}")
-        return response.json()
-
-    def dog(self):
-        url = "https://dog.ceo/api/breeds/image/random"
-        response = self.getInfo(url)
-        if (response):
+            return None
+
+    async def random_dog_url(self):
+        """ランダムな犬画像のURLを返す。取得できなければNone"""
+        response = await self.getInfo(DOG_API_URL)
+        if response and response.get('status') == 'success':
             return response['message']
+        return None
+
+    async def dog(self):
+        url = await self.random_dog_url()
+        if (url):
+            return url
         else:
             logger.warning("[API] dog API: レスポンスが空です")
             return "取得できなかった"
+
+    async def close(self):
+        await self.http.close()
+
+
+class DogImagePool:
+    """
+    犬画像のURLを先読みしておくリングバッファ
+
+    バックグラウンドのタスクがバッファを補充し、/dogはバッファから即座に返答する。
+    バッファが空のときだけ、その場でAPIを呼ぶ。
+    """
+
+    def __init__(
+        self,
+        api: API,
+        size: int | None = None,
+        refill_interval: float | None = None,
+        validate: bool | None = None,
+    ):
+        """
+        Args:
+            size: バッファに保持するURL数（既定: 環境変数DOG_POOL_SIZE、なければ5）
+            refill_interval: 補充時のAPI呼び出し間隔（秒）（既定: DOG_POOL_REFILL_INTERVAL、なければ2）
+            validate: 補充時にHEADリクエストで画像が取得できるか確認するか（既定: DOG_POOL_VALIDATE）
+        """
+        self.api = api
+        self.size = size if size is not None else int(os.getenv('DOG_POOL_SIZE', 5))
+        self.refill_interval = (
+            refill_interval if refill_interval is not None
+            else float(os.getenv('DOG_POOL_REFILL_INTERVAL', 2.0)))
+        self.validate = (
+            validate if validate is not None
+            else os.getenv('DOG_POOL_VALIDATE', 'false').lower() == 'true')
+        self.hits = 0
+        self.misses = 0
+        self._buffer: deque[str] = deque(maxlen=self.size)
+        self._consumed = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def stats(self) -> dict:
+        return {"buffered": len(self._buffer), "size": self.size, "hits": self.hits, "misses": self.misses}
+
+    def start(self) -> None:
+        """補充タスクを開始する（イベントループ上で呼ぶこと）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refill_loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def take(self) -> str | None:
+        """バッファからURLを1つ取り出す。空ならNone"""
+        if not self._buffer:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._consumed.set()
+        return self._buffer.popleft()
+
+    async def _refill_loop(self) -> None:
+        while True:
+            if len(self._buffer) >= self.size:
+                # 満杯なら取り出されるまで待つ
+                self._consumed.clear()
+                await self._consumed.wait()
+                continue
+            try:
+                url = await self._fetch()
+                if url is not None:
+                    self._buffer.append(url)
+            except Exception as e:
+                logger.error(f"[DogImagePool] 補充エラー: {e}")
+            await asyncio.sleep(self.refill_interval)
+
+    async def _fetch(self) -> str | None:
+        url = await self.api.random_dog_url()
+        if url is None or not self.validate:
+            return url
+        try:
+            await self.api.http.request("HEAD", url)
+        except HttpError as e:
+            logger.warning(f"[DogImagePool] 画像を確認できないため破棄: {e}")
+            return None
+        return url
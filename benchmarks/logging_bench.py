@@ -0,0 +1,89 @@
+"""
+ログ出力1回あたりにイベントループを占有する時間のベンチマーク
+
+コンソール・ファイルのハンドラーをロガーに直接付けた場合（書き込みをその場で行う）と、
+QueueHandler経由で専用スレッドに書き出しを任せた場合（utils.loggerの構成）を比べます。
+
+使い方:
+    python -m benchmarks.logging_bench            # 20000回ずつ計測
+    python -m benchmarks.logging_bench --json     # JSON形式で出力する場合
+"""
+import argparse
+import asyncio
+import logging
+import os
+import queue
+import statistics
+import sys
+import tempfile
+import time
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+
+from utils.logger import build_handlers
+
+
+async def _measure(logger: logging.Logger, count: int) -> list[float]:
+    """イベントループ上でlogger.infoを呼び、1回ごとの所要時間（マイクロ秒）を返す"""
+    samples = []
+    for i in range(count):
+        started = time.perf_counter_ns()
+        logger.info("[575] user=%s guild=%s message=%s", "someone#0001", "server", f"古池や 蛙飛び込む 水の音 {i}")
+        samples.append((time.perf_counter_ns() - started) / 1000)
+        if i % 100 == 0:
+            # 他のタスクにも順番を回す（実際のBotと同様にループが回っている状態にする）
+            await asyncio.sleep(0)
+    return samples
+
+
+def _run(mode: str, count: int, json_format: bool, log_dir: Path) -> list[float]:
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        handlers = build_handlers(log_dir / f"{mode}.log", json_format, stream=devnull)
+        logger = logging.getLogger(f"bench.{mode}")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+
+        listener = None
+        if mode == "direct":
+            for handler in handlers:
+                logger.addHandler(handler)
+        else:
+            log_queue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+            listener.start()
+            logger.addHandler(QueueHandler(log_queue))
+
+        samples = asyncio.run(_measure(logger, count))
+
+        if listener is not None:
+            listener.stop()
+        for handler in handlers:
+            handler.close()
+        logger.handlers.clear()
+    return samples
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ログ出力1回あたりのコストのベンチマーク")
+    parser.add_argument("-n", "--count", type=int, default=20000, help="ログ出力の回数")
+    parser.add_argument("--json", action="store_true", help="JSON形式で出力する")
+    args = parser.parse_args(argv)
+
+    print(f"calls: {args.count} / format: {'json' if args.json else 'text'}")
+    print(f"{'mode':<8}{'mean (us)':>11}{'p50 (us)':>11}{'p99 (us)':>11}{'max (us)':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("direct", "queued"):
+            samples = sorted(_run(mode, args.count, args.json, Path(tmp)))
+            print(
+                f"{mode:<8}{statistics.fmean(samples):>11.1f}{_percentile(samples, 0.50):>11.1f}"
+                f"{_percentile(samples, 0.99):>11.1f}{samples[-1]:>11.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
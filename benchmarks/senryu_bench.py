@@ -0,0 +1,179 @@
+"""
+川柳検出（split_575）のベンチマーク
+
+チャットコーパス（tests/data/senryu_corpus.txt）と、その文を組み合わせた合成メッセージを
+split_575に流し、スループット・レイテンシ・メモリ使用量・janomeが占める時間の割合を表示します。
+
+使い方:
+    python -m benchmarks.senryu_bench                  # 計測して表示
+    python -m benchmarks.senryu_bench --save-baseline  # 結果をベースラインとして保存
+    python -m benchmarks.senryu_bench --check          # ベースラインより閾値以上遅ければ終了コード1
+"""
+import argparse
+import json
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from senryu import counter, split_575
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+CORPUS_PATH = ROOT_DIR / "tests" / "data" / "senryu_corpus.txt"
+BASELINE_PATH = Path(__file__).resolve().parent / "senryu_baseline.json"
+
+# 合成メッセージに混ぜる語尾や記号。キャッシュに乗らない文を作るために使う
+_SUFFIXES = ["", "な", "よ", "ね", "わ", "w", "！", "？", "…", "😂", "草"]
+
+
+def load_corpus(path: Path = CORPUS_PATH) -> list[str]:
+    """コーパスを読み込む。1行1メッセージで、\\n は改行として扱う"""
+    lines = path.read_text(encoding="utf-8").splitlines()
+    return [line.replace("\\n", "\n") for line in lines if line and not line.startswith("#")]
+
+
+def build_messages(corpus: list[str], count: int, seed: int = 575) -> list[str]:
+    """
+    コーパスから計測用のメッセージ列を作る。
+    半分はコーパスのメッセージそのもの（定型文の繰り返し）、残りは文を組み合わせて語尾を変えた合成メッセージ。
+    """
+    rng = random.Random(seed)
+    sentences = [s for message in corpus for s in message.split("\n")]
+    messages = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            messages.append(rng.choice(corpus))
+        else:
+            parts = [rng.choice(sentences) + rng.choice(_SUFFIXES) for _ in range(rng.randint(1, 4))]
+            messages.append("\n".join(parts))
+    return messages
+
+
+class _JanomeTimer:
+    """Tokenizer.tokenizeを包み、janome内で費やした時間を積算する"""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.elapsed = 0.0
+        self._original = tokenizer.tokenize
+
+    def __enter__(self):
+        def timed(text, *args, **kwargs):
+            started = time.perf_counter()
+            tokens = list(self._original(text, *args, **kwargs))
+            self.elapsed += time.perf_counter() - started
+            return tokens
+
+        self.tokenizer.tokenize = timed
+        return self
+
+    def __exit__(self, *exc):
+        del self.tokenizer.tokenize
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run(messages: list[str], use_cache: bool = True) -> dict:
+    """メッセージ列をsplit_575に流して計測結果を返す"""
+    counter.warm_up()
+    counter._tokenize.cache_clear()
+
+    latencies = []
+    detected = 0
+    with _JanomeTimer(counter._get_tokenizer()) as janome:
+        started = time.perf_counter()
+        for message in messages:
+            if not use_cache:
+                counter._tokenize.cache_clear()
+            t0 = time.perf_counter()
+            if split_575(message) is not None:
+                detected += 1
+            latencies.append(time.perf_counter() - t0)
+        total = time.perf_counter() - started
+    cache = counter.token_cache_info()
+
+    # tracemallocは計測を大きく遅くするため、メモリは別パスで測る
+    counter._tokenize.cache_clear()
+    tracemalloc.start()
+    for message in messages:
+        split_575(message)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    lookups = cache.hits + cache.misses
+    return {
+        "messages": len(messages),
+        "detected": detected,
+        "messages_per_sec": len(messages) / total,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "peak_traced_mb": peak / 1024 / 1024,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "janome_share": janome.elapsed / total,
+        "cache_hit_rate": cache.hits / lookups if lookups else 0.0,
+    }
+
+
+def check_regression(result: dict, baseline: dict, threshold: float) -> list[str]:
+    """ベースラインと比べて閾値（割合）を超えて悪化した指標を返す"""
+    failures = []
+    if result["messages_per_sec"] < baseline["messages_per_sec"] * (1 - threshold):
+        failures.append(
+            f"messages/sec {result['messages_per_sec']:.0f} < baseline {baseline['messages_per_sec']:.0f}")
+    # p50はキャッシュヒットで数十マイクロ秒と小さく揺らぎやすいため、p99だけを見る
+    if result["p99_ms"] > baseline["p99_ms"] * (1 + threshold):
+        failures.append(f"p99_ms {result['p99_ms']:.3f} > baseline {baseline['p99_ms']:.3f}")
+    return failures
+
+
+def _print_result(result: dict) -> None:
+    print(f"messages        : {result['messages']} (detected {result['detected']})")
+    print(f"throughput      : {result['messages_per_sec']:.0f} messages/sec")
+    print(f"latency         : p50 {result['p50_ms']:.3f} ms / p99 {result['p99_ms']:.3f} ms")
+    print(f"memory          : peak traced {result['peak_traced_mb']:.1f} MB / max RSS {result['max_rss_mb']:.1f} MB")
+    print(f"janome share    : {result['janome_share']:.1%}")
+    print(f"token cache hit : {result['cache_hit_rate']:.1%}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="split_575のベンチマーク")
+    parser.add_argument("-n", "--messages", type=int, default=5000, help="計測するメッセージ数")
+    parser.add_argument("--seed", type=int, default=575)
+    parser.add_argument("--no-cache", action="store_true", help="メッセージごとにトークンキャッシュを消す")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="結果をベースラインとして保存する")
+    parser.add_argument("--check", action="store_true", help="ベースラインと比較し、悪化していれば失敗する")
+    parser.add_argument("--threshold", type=float, default=0.2, help="許容する悪化の割合（既定: 0.2 = 20%%）")
+    args = parser.parse_args(argv)
+
+    messages = build_messages(load_corpus(), args.messages, seed=args.seed)
+    result = run(messages, use_cache=not args.no_cache)
+    _print_result(result)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(result, indent=2), encoding="utf-8")
+        print(f"baseline saved: {args.baseline}")
+
+    if args.check:
+        if not args.baseline.exists():
+            print(f"baseline not found: {args.baseline}（--save-baseline で作成してください）")
+            return 1
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        failures = check_regression(result, baseline, args.threshold)
+        for failure in failures:
+            print(f"REGRESSION: {failure}")
+        if failures:
+            return 1
+        print("OK: ベースラインとの差は閾値内です")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+reminders.db・senryu.db のクエリのベンチマーク
+
+初期スキーマ（v1: 時刻はISO文字列、索引なし）のDBにダミーデータを入れてストアの各クエリを計測し、
+マイグレーションを適用したあと（時刻はUNIX時間の整数列、複合索引あり）に同じクエリを計測し直します。
+
+使い方:
+    python -m benchmarks.sqlite_bench              # 各テーブル100万行で計測
+    python -m benchmarks.sqlite_bench -n 100000    # 行数を変える
+"""
+import argparse
+import asyncio
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from reminder import store as reminder_store
+from senryu import store as senryu_store
+from utils.sqlite import DatabaseManager, to_epoch_ms
+
+GUILDS = 1000
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+# 現在時刻をまたいで配置するため、配信時刻を過ぎているのは全体のごく一部になる
+SPREAD = timedelta(days=365)
+
+
+def _timestamps(rng: random.Random, count: int) -> list[datetime]:
+    return [NOW - timedelta(minutes=10) + SPREAD * rng.random() for _ in range(count)]
+
+
+async def _create_v1(path: Path, migrations) -> None:
+    databases = DatabaseManager()
+    await databases.get(path).migrate(migrations[:1])
+    await databases.close_all()
+
+
+async def _migrate(path: Path, migrations) -> float:
+    databases = DatabaseManager()
+    started = time.perf_counter()
+    await databases.get(path).migrate(migrations)
+    elapsed = time.perf_counter() - started
+    await databases.close_all()
+    return elapsed
+
+
+def _populate(path: Path, rows: int, seed: int) -> None:
+    rng = random.Random(seed)
+    with sqlite3.connect(path) as conn:
+        if "reminders" in path.name:
+            conn.executemany(
+                "INSERT INTO reminders (guild_id, channel_id, user_id, message, remind_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (rng.randrange(GUILDS), 1, rng.randrange(10000), "benchmark", at.isoformat(), NOW.isoformat())
+                    for at in _timestamps(rng, rows)
+                ),
+            )
+        else:
+            conn.executemany(
+                "INSERT INTO senryus (guild_id, channel_id, user_id, message_id, line1, line2, line3, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (rng.randrange(GUILDS), 1, rng.randrange(10000), i, "古池や", "蛙飛び込む", "水の音", at.isoformat())
+                    for i, at in enumerate(_timestamps(rng, rows))
+                ),
+            )
+    conn.close()
+
+
+def _queries(migrated: bool) -> dict[str, tuple[str, str, tuple]]:
+    """計測するクエリ（ストアと同じSQL）。値: (DBの種類, SQL, パラメータ)"""
+    now = to_epoch_ms(NOW) if migrated else NOW.isoformat()
+    # マイグレーション後のcount_by_guildはguild_senryu_countsを引く（起動後はメモリ上の写しを返す）
+    count_sql = (
+        "SELECT count FROM guild_senryu_counts WHERE guild_id = ?" if migrated
+        else "SELECT COUNT(*) FROM senryus WHERE guild_id = ?")
+    return {
+        # マイグレーション後はclaim_dueと同じ更新を計測する（計測のたびにロールバックする）
+        "reminders due": (
+            "reminders",
+            "UPDATE reminders SET status = 'sending' WHERE status = 'pending' AND next_attempt_at <= ? RETURNING *"
+            if migrated else "SELECT * FROM reminders WHERE remind_at <= ? ORDER BY remind_at ASC",
+            (now,)),
+        "reminders list_by_guild": (
+            "reminders", "SELECT * FROM reminders WHERE guild_id = ? ORDER BY remind_at ASC", (42,)),
+        "senryus count_by_guild": (
+            "senryu", count_sql, (42,)),
+        "senryus recent_by_guild": (
+            "senryu", "SELECT * FROM senryus WHERE guild_id = ? ORDER BY created_at DESC LIMIT ?", (42, 5)),
+    }
+
+
+def _measure(paths: dict[str, Path], migrated: bool, repeat: int) -> dict[str, float]:
+    """各クエリの実行時間の中央値（ミリ秒）を返す"""
+    results = {}
+    for name, (kind, sql, params) in _queries(migrated).items():
+        with sqlite3.connect(paths[kind]) as conn:
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                conn.execute(sql, params).fetchall()
+                samples.append(time.perf_counter() - started)
+                conn.rollback()
+        conn.close()
+        results[name] = statistics.median(samples) * 1000
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="reminders.db・senryu.dbのクエリのベンチマーク")
+    parser.add_argument("-n", "--rows", type=int, default=1_000_000, help="各テーブルの行数")
+    parser.add_argument("--repeat", type=int, default=5, help="各クエリの計測回数（中央値を表示）")
+    parser.add_argument("--seed", type=int, default=575)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {"reminders": Path(tmp) / "reminders.db", "senryu": Path(tmp) / "senryu.db"}
+        migrations = {"reminders": reminder_store.MIGRATIONS, "senryu": senryu_store.MIGRATIONS}
+
+        for kind, path in paths.items():
+            asyncio.run(_create_v1(path, migrations[kind]))
+            _populate(path, args.rows, args.seed)
+        before = _measure(paths, migrated=False, repeat=args.repeat)
+
+        migrate_seconds = {
+            kind: asyncio.run(_migrate(path, migrations[kind])) for kind, path in paths.items()}
+        after = _measure(paths, migrated=True, repeat=args.repeat)
+
+    print(f"rows per table: {args.rows:,} / guilds: {GUILDS}")
+    print(f"{'query':<26}{'before (ms)':>13}{'after (ms)':>13}{'speedup':>10}")
+    for name in before:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(f"{name:<26}{before[name]:>13.3f}{after[name]:>13.3f}{speedup:>9.0f}x")
+    for kind, seconds in migrate_seconds.items():
+        print(f"migration {kind}.db: {seconds:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,32 @@
+import asyncio
 import os
 import discord
 from discord import app_commands
 from discord.ext.commands import Bot
-from discord.ext import tasks
 import api
-from ai import AIManager, AIError
-from reminder import JST, ReminderStore, ReminderTimeError, parse_datetime
-from senryu import split_575, SenryuStore
+from ai import AIManager, AIError, SearchCache
+from ai.search_cache import normalize_query
+from reminder import JST, Reminder, ReminderScheduler, ReminderStore, ReminderTimeError, parse_datetime
+from senryu import SenryuDetector, SenryuStore
 import traceback
 import random
-from datetime import datetime, timezone
-from ddgs import DDGS
+from contextlib import aclosing
+from typing import Awaitable, TypeVar
 
 import sys
 import logging
+import time
+from utils import metrics
+from utils.command_sync import CommandSyncer
+from utils.image_search import ImagePager, ImageSearch
 from utils.logger import setup_logger
+from utils.loop_monitor import LoopMonitor
+from utils.member_names import MemberNameCache
+from utils.metrics import DISCORD_SEND_SECONDS, MetricsServer
+from utils.shutdown import install_shutdown_handler
+from utils.singleflight import SingleFlight
+from utils.sqlite import DatabaseManager
+from utils.stream_sink import DiscordStreamSink
 
 # アプリケーションロガーのセットアップ
 logger = setup_logger(__name__)
@@ -24,10 +36,133 @@ discord_logger = setup_logger('discord')
 discord_logger.setLevel(logging.INFO)
 
 API = api.API()
+dog_pool = api.DogImagePool(API)
 ai_mgr = AIManager()
-reminder_store = ReminderStore()
-senryu_store = SenryuStore()
-bot = Bot(command_prefix='$', intents=discord.Intents.all())
+# SQLiteの接続はDBファイルごとに1本を開いたまま使い回す
+databases = DatabaseManager()
+reminder_store = ReminderStore(databases=databases)
+reminder_scheduler = ReminderScheduler(reminder_store, lambda reminder: deliver_reminder(reminder))
+senryu_store = SenryuStore(databases=databases)
+search_cache = SearchCache(databases=databases)
+# 同じクエリの/search・/imageが同時に来たら外部APIへのリクエストを1回にまとめる
+inflight = SingleFlight()
+# /imageの検索結果（ページ送り用に複数件）をクエリごとにキャッシュする
+image_search = ImageSearch()
+senryu_detector = SenryuDetector()
+# METRICS_PORTを設定すると /metrics でPrometheus形式のメトリクスを公開する
+metrics_server = MetricsServer()
+# イベントループの遅延を計測し、ループを止めている同期処理の呼び出し箇所を記録する
+loop_monitor = LoopMonitor()
+# 一覧に表示するメンバー名。メンバー一覧をキャッシュせず、必要な分だけ取得して有効期限付きで保持する
+member_names = MemberNameCache()
+
+COMMAND_SECONDS = metrics.histogram(
+    "discord_command_seconds", "スラッシュコマンドの受信から処理完了までの時間", ["command", "status"])
+COMMANDS = metrics.counter("discord_commands_total", "スラッシュコマンドの実行回数", ["command", "status"])
+SEND_ERRORS = metrics.counter("discord_send_errors_total", "Discordへの送信に失敗した回数", ["kind"])
+
+T = TypeVar("T")
+
+
+async def _send(kind: str, send: Awaitable[T]) -> T:
+    """Discordへの送信を待ち、所要時間と失敗回数をkindごとに記録する（失敗時の例外はそのまま送出する）"""
+    try:
+        with DISCORD_SEND_SECONDS.time(kind=kind):
+            return await send
+    except discord.HTTPException:
+        SEND_ERRORS.inc(kind=kind)
+        raise
+
+
+def _observe_command(interaction: discord.Interaction, status: str) -> None:
+    started = interaction.extras.get("started_at")
+    command = interaction.command.qualified_name if interaction.command else "unknown"
+    COMMANDS.inc(command=command, status=status)
+    if started is not None:
+        COMMAND_SECONDS.observe(time.perf_counter() - started, command=command, status=status)
+
+
+class BotCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # 処理時間の計測開始。完了はon_app_command_completion、失敗はon_errorで記録する
+        interaction.extras["started_at"] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError) -> None:
+        _observe_command(interaction, "error")
+        await super().on_error(interaction, error)
+
+
+class DiscordBot(Bot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # on_readyは再接続のたびに呼ばれるため、起動時の処理を済ませたかを記録する
+        self._ready_once = False
+
+    async def on_ready(self):
+        if self._ready_once:
+            logger.info(f"{self.user}:再接続")
+            return
+        self._ready_once = True
+
+        # チャンネルのキャッシュがそろってから配信を始める。コマンドの同期に失敗しても配信は止めない
+        await reminder_scheduler.start()
+        try:
+            await command_syncer.sync(self.guilds)
+        except Exception as e:
+            logger.error(f"[sync] 起動時のコマンド同期に失敗（/sync で再実行できます）: {type(e).__name__}: {e}")
+
+        logger.info(f"python-version：{sys.version}")
+        logger.info(f"{self.user}:起動完了")
+
+    async def setup_hook(self):
+        # 1プロセスで1回だけ行う初期化（on_readyは再接続のたびに呼ばれる）
+        # docker stopなどのSIGTERMでもclose()を通し、write-behindの川柳を書き込んでから終了する
+        install_shutdown_handler(self.close)
+        loop_monitor.start()
+        await metrics_server.start()
+        await reminder_store.init()
+        await senryu_store.init()
+        await search_cache.init()
+        senryu_detector.warm_up()
+        dog_pool.start()
+
+    async def close(self):
+        await reminder_scheduler.close()
+        # 先にGatewayを切断し、新しいイベント（川柳の登録など）が届かないようにする
+        await super().close()
+        senryu_detector.close()
+        # write-behindでたまっている川柳を書き込んでから接続を閉じる
+        await senryu_store.close()
+        await databases.close_all()
+        await dog_pool.close()
+        await API.close()
+        await metrics_server.close()
+        await loop_monitor.close()
+
+
+def _build_intents() -> tuple[discord.Intents, bool]:
+    """
+    (intents, 起動時にメンバー一覧を取得するか) を返す。
+    DISCORD_MINIMAL_INTENTS=true なら川柳検出とメンションに必要なmessage_contentだけを特権intentとして有効にし、
+    メンバー・プレゼンスのキャッシュとメンバー一覧の取得を行わない（大きなサーバーでメモリを節約する）
+    """
+    if os.getenv('DISCORD_MINIMAL_INTENTS', 'false').lower() == 'true':
+        intents = discord.Intents.default()
+        intents.message_content = True
+        return intents, False
+    return discord.Intents.all(), True
+
+
+intents, chunk_guilds_at_startup = _build_intents()
+bot = DiscordBot(
+    command_prefix='$',
+    intents=intents,
+    chunk_guilds_at_startup=chunk_guilds_at_startup,
+    tree_cls=BotCommandTree,
+)
+# コマンド定義が前回の同期から変わった場合だけ同期する
+command_syncer = CommandSyncer(bot.tree)
 
 
 def _error_embed(description: str, title: str = "エラー") -> discord.Embed:
@@ -42,42 +177,38 @@ SUMABRA_CHARA = ["マリオ", "マルス", "ピクミン&オリマー", "クラ
 
 
 @bot.event
-async def on_ready():
-    for server in bot.guilds:
-        await bot.tree.sync(guild=discord.Object(id=server.id))
-
-    await bot.tree.sync()
-
-    await reminder_store.init()
-    await senryu_store.init()
-    if not check_reminders.is_running():
-        check_reminders.start()
-
-    logger.info(f"python-version：{sys.version}")
-    logger.info(f"{bot.user}:起動完了")
-
-
-@tasks.loop(seconds=30)
-async def check_reminders():
-    try:
-        due = await reminder_store.get_due(datetime.now(timezone.utc))
-    except Exception as e:
-        logger.error(f"[reminder] 取得エラー: {e}")
+async def on_guild_join(guild: discord.Guild):
+    # 新しく参加したサーバーのコマンドだけを同期する（定義が変わっていなければグローバルは省略される）
+    await command_syncer.sync([guild])
+
+
+async def deliver_reminder(reminder: Reminder) -> None:
+    """
+    時刻になったリマインダーを設定されたチャンネルに送信する。
+    一時的な送信エラーは送出し、スケジューラに再試行させる
+    """
+    channel = bot.get_channel(reminder.channel_id)
+    if channel is None:
+        logger.warning(
+            f"[reminder] channel not found id={reminder.id} channel_id={reminder.channel_id}")
         return
+    if channel.guild:
+        creator = await member_names.display_name(channel.guild, reminder.user_id)
+    else:
+        creator = str(reminder.user_id)
+    content = f"{reminder.message}\n\n-# ⏰ リマインダー • {creator}が設定"
+    try:
+        await _send("reminder", channel.send(content))
+    except discord.HTTPException as e:
+        if not isinstance(e, (discord.Forbidden, discord.NotFound)):
+            raise
+        # 権限がない・チャンネルが消えた場合は再試行しても届かない
+        logger.error(f"[reminder] 送信エラー id={reminder.id}: {e}")
 
-    for reminder in due:
-        await reminder_store.delete(reminder.id)
-        channel = bot.get_channel(reminder.channel_id)
-        if channel is None:
-            logger.warning(
-                f"[reminder] channel not found id={reminder.id} channel_id={reminder.channel_id}")
-            continue
-        creator = _display_name(channel.guild, reminder.user_id) if channel.guild else str(reminder.user_id)
-        content = f"{reminder.message}\n\n-# ⏰ リマインダー • {creator}が設定"
-        try:
-            await channel.send(content)
-        except discord.HTTPException as e:
-            logger.error(f"[reminder] 送信エラー id={reminder.id}: {e}")
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    _observe_command(interaction, "ok")
 
 
 @bot.event
@@ -96,19 +227,59 @@ async def talk(interaction: discord.Interaction, message: str, image: discord.At
     await interaction.response.defer(thinking=True)
     # DMからのコマンドは拒否
     if isinstance(interaction.channel, discord.DMChannel):
-        await interaction.followup.send(embed=DM_REJECTED_EMBED, ephemeral=True)
+        await _send("talk", interaction.followup.send(embed=DM_REJECTED_EMBED, ephemeral=True))
         return
 
     image_url = image.url if image else None
     message_quoted = "> " + message
+    if ai_mgr.streaming:
+        # /talkコマンドでは引用を付ける
+        sink = DiscordStreamSink(
+            lambda content: interaction.followup.send(content, wait=True),
+            header=f"{message_quoted}\n\n")
+        try:
+            await _stream_ai_reply(
+                sink, message, image_url=image_url,
+                guild_id=interaction.guild.id, channel_id=interaction.channel.id)
+            logger.info(f"[/talk] time_to_first_token={sink.first_visible_latency:.2f}s")
+        except AIError as e:
+            logger.error(f"[/talk] Error: {e}")
+            if sink.text:
+                await _send("talk", interaction.followup.send(embed=ERROR_EMBED))
+            else:
+                await _send("talk", interaction.followup.send(message_quoted, embed=ERROR_EMBED))
+        except discord.HTTPException as e:
+            # 途中経過の反映（編集）がレート制限などで失敗した場合も、エラーを伝える
+            SEND_ERRORS.inc(kind="stream")
+            logger.error(f"[/talk] 送信エラー: {e}")
+            await _send("talk", interaction.followup.send(message_quoted, embed=ERROR_EMBED))
+        return
+
     try:
-        response = ai_mgr.send_message(message, image_url=image_url)
+        response = await ai_mgr.send_message(
+            message, image_url=image_url,
+            guild_id=interaction.guild.id, channel_id=interaction.channel.id)
         # /talkコマンドでは引用を付ける
         final_response = f"{message_quoted}\n\n{response}"
-        await interaction.followup.send(final_response)
+        await _send("talk", interaction.followup.send(final_response))
     except AIError as e:
         logger.error(f"[/talk] Error: {e}")
-        await interaction.followup.send(message_quoted, embed=ERROR_EMBED)
+        await _send("talk", interaction.followup.send(message_quoted, embed=ERROR_EMBED))
+
+
+async def _stream_ai_reply(sink: DiscordStreamSink, message: str, *, image_url: str = None,
+                           guild_id: int, channel_id: int) -> None:
+    """AIの応答をストリーミングで受け取り、一定間隔でDiscordのメッセージに反映する"""
+    stream = ai_mgr.stream_message(
+        message, image_url=image_url, guild_id=guild_id, channel_id=channel_id)
+    try:
+        async with aclosing(stream):
+            async for delta in stream:
+                await sink.write(delta)
+        await sink.close()
+    finally:
+        # 途中で失敗した場合に、タイマーでの反映が残らないようにする
+        sink.cancel()
 
 
 @bot.event
@@ -120,7 +291,7 @@ async def on_message(message):
     # 5-7-5（川柳）を検出
     content_stripped = message.content.strip()
     if content_stripped and message.guild is not None:
-        lines = split_575(content_stripped)
+        lines = await senryu_detector.detect(content_stripped)
         if lines:
             logger.info(
                 f"[575] user={message.author} guild={message.guild} message={content_stripped[:50]}")
@@ -132,8 +303,13 @@ async def on_message(message):
                     message_id=message.id,
                     lines=lines,
                 )
+                if isinstance(message.author, discord.Member):
+                    # /senryu_listで表示するため、受け取ったメンバー情報から表示名を覚えておく
+                    member_names.remember(message.author)
                 haiku = "「"+" ".join(lines)+"」"
-                await message.reply(f"川柳、いただきました（{count}個目）\n{haiku}", mention_author=False)
+                await _send(
+                    "senryu_reply",
+                    message.reply(f"川柳、いただきました（{count}個目）\n{haiku}", mention_author=False))
             except discord.HTTPException as e:
                 logger.error(f"[575] 送信エラー: {e}")
             except Exception as e:
@@ -147,32 +323,52 @@ async def on_message(message):
 
         # 空メッセージの場合は定型文を返す
         if not content:
-            await message.channel.send("何かご用ですか？")
+            await _send("mention", message.channel.send("何かご用ですか？"))
             return
 
         # DMからは拒否
         if isinstance(message.channel, discord.DMChannel):
-            await message.channel.send(embed=DM_REJECTED_EMBED)
+            await _send("mention", message.channel.send(embed=DM_REJECTED_EMBED))
             return
 
         # タイピングインジケータを表示しながらAI応答取得と送信
         logger.info(
             f"[mention] user={message.author} guild={message.guild} message={content[:50]}")
         async with message.channel.typing():
+            if ai_mgr.streaming:
+                sink = DiscordStreamSink(message.channel.send)
+                try:
+                    await _stream_ai_reply(
+                        sink, content, guild_id=message.guild.id, channel_id=message.channel.id)
+                    logger.info(f"[mention] time_to_first_token={sink.first_visible_latency:.2f}s")
+                except AIError as e:
+                    logger.error(f"[mention] Error: {e}")
+                    if sink.text:
+                        await _send("mention", message.channel.send(embed=ERROR_EMBED))
+                    else:
+                        await _send("mention", message.channel.send("> " + content, embed=ERROR_EMBED))
+                except discord.HTTPException as e:
+                    SEND_ERRORS.inc(kind="stream")
+                    logger.error(f"[mention] 送信エラー: {e}")
+                    await _send("mention", message.channel.send("> " + content, embed=ERROR_EMBED))
+                return
+
             try:
-                response = ai_mgr.send_message(content)
-                await message.channel.send(response)
+                response = await ai_mgr.send_message(
+                    content, guild_id=message.guild.id, channel_id=message.channel.id)
+                await _send("mention", message.channel.send(response))
             except AIError as e:
                 logger.error(f"[mention] Error: {e}")
                 message_quoted = "> " + content
-                await message.channel.send(message_quoted, embed=ERROR_EMBED)
+                await _send("mention", message.channel.send(message_quoted, embed=ERROR_EMBED))
 
 
 @bot.tree.command(name="search", description="Webを検索して要約")
-async def search(interaction: discord.Interaction, query: str):
+@app_commands.describe(fresh="キャッシュを使わずに検索し直すか")
+async def search(interaction: discord.Interaction, query: str, fresh: bool = False):
     """Perplexity APIで直接Web検索"""
     logger.info(
-        f"[/search] user={interaction.user} guild={interaction.guild} query={query[:50]}")
+        f"[/search] user={interaction.user} guild={interaction.guild} query={query[:50]} fresh={fresh}")
     # DMからのコマンドは拒否
     if isinstance(interaction.channel, discord.DMChannel):
         await interaction.response.send_message(embed=DM_REJECTED_EMBED, ephemeral=True)
@@ -182,14 +378,26 @@ async def search(interaction: discord.Interaction, query: str):
 
     # Perplexityが利用可能かチェック
     if not ai_mgr.perplexity_client:
-        await interaction.followup.send(embed=_error_embed("Web検索機能が利用できません。", title="検索エラー"))
+        await _send("search", interaction.followup.send(embed=_error_embed("Web検索機能が利用できません。", title="検索エラー")))
         return
 
     query_quoted = f"> {query}"
 
     try:
-        # Perplexityで直接検索
-        result = ai_mgr.perplexity_client.search(query)
+        # 同じ質問の結果がキャッシュにあればAPIを呼ばずに返す
+        result = None if fresh else await search_cache.get(query)
+        cached = result is not None
+        logger.info(f"[/search] cached={cached} hit_rate={search_cache.hit_rate:.1%}")
+        if not cached:
+            # Perplexityで直接検索（同じクエリの検索が実行中ならその結果を共有する）
+            result = await inflight.do(
+                ("search", normalize_query(query)),
+                lambda: ai_mgr.search(query, guild_id=interaction.guild.id))
+            result = {"content": result["content"], "citations": list(result.get("citations") or [])}
+            try:
+                await search_cache.set(query, result)
+            except Exception as e:
+                logger.warning(f"[/search] キャッシュ保存エラー: {e}")
 
         # 応答本文を取得
         response_text = result["content"]
@@ -202,15 +410,18 @@ async def search(interaction: discord.Interaction, query: str):
             for i, url in enumerate(citations[:max_links], start=1):
                 response_text += f"\n{i}. <{url}>"
 
+        if cached:
+            response_text += "\n\n-# キャッシュ済みの結果です（`fresh:True` で再検索）"
+
         # 検索クエリの引用を追加
         final_response = f"{query_quoted}\n\n{response_text}"
-        await interaction.followup.send(final_response)
+        await _send("search", interaction.followup.send(final_response))
 
     except Exception as e:
         logger.error(f"[/search] Error: {e}")
-        await interaction.followup.send(
+        await _send("search", interaction.followup.send(
             query_quoted,
-            embed=_error_embed(f"検索中にエラーが発生しました: {str(e)}", title="検索エラー"))
+            embed=_error_embed(f"検索中にエラーが発生しました: {str(e)}", title="検索エラー")))
 
 
 @bot.tree.command(name="image", description="画像を検索")
@@ -221,25 +432,44 @@ async def image(interaction: discord.Interaction, query: str):
         await interaction.response.send_message(embed=DM_REJECTED_EMBED, ephemeral=True)
         return
 
+    # キャッシュにあれば検索せず、deferもせずに即座に返答する
+    results = image_search.cached(query)
+    if results is not None:
+        logger.info(f"[/image] cache hit query={query[:50]}")
+        pager = ImagePager(query, results)
+        if len(results) > 1:
+            await interaction.response.send_message(f"> {query}", embed=pager.embed(), view=pager)
+            pager.message = await interaction.original_response()
+        else:
+            await interaction.response.send_message(f"> {query}", embed=pager.embed())
+        return
+
     await interaction.response.defer(thinking=True)
 
     try:
-        with DDGS() as ddgs:
-            results = list(ddgs.images(query, max_results=1))
+        # 同じクエリの検索が実行中ならその結果を共有する
+        results = await inflight.do(
+            ("image", normalize_query(query)), lambda: image_search.fetch(query))
 
         if not results:
-            await interaction.followup.send(f"> {query}\n\n画像が見つかりませんでした。")
+            await _send("image", interaction.followup.send(f"> {query}\n\n画像が見つかりませんでした。"))
             return
 
-        img = results[0]
-        embed = discord.Embed(title=img.get("title", query), color=0x5865F2)
-        embed.set_image(url=img["image"])
-        embed.set_footer(text=f"検索: {query} | 出典: {img.get('source', '')}")
-        await interaction.followup.send(f"> {query}", embed=embed)
-
+        pager = ImagePager(query, results)
+        if len(results) > 1:
+            pager.message = await _send("image", interaction.followup.send(
+                f"> {query}", embed=pager.embed(), view=pager, wait=True))
+        else:
+            await _send("image", interaction.followup.send(f"> {query}", embed=pager.embed()))
+
+    except asyncio.TimeoutError:
+        logger.error(f"[/image] Timeout query={query[:50]}")
+        await _send("image", interaction.followup.send(
+            f"> {query}", embed=_error_embed("画像検索がタイムアウトしました。", title="検索エラー")))
     except Exception as e:
         logger.error(f"[/image] Error: {e}")
-        await interaction.followup.send(f"> {query}", embed=_error_embed(str(e), title="検索エラー"))
+        await _send("image", interaction.followup.send(
+            f"> {query}", embed=_error_embed(str(e), title="検索エラー")))
 
 
 @bot.tree.command(name="r", description="数字をランダム出力")
@@ -257,11 +487,6 @@ async def r_suma(interaction):
     await interaction.response.send_message(chara)
 
 
-def _display_name(guild: discord.Guild, user_id: int) -> str:
-    member = guild.get_member(user_id)
-    return member.display_name if member else f"<@{user_id}>"
-
-
 @bot.tree.command(name="remind", description="指定した日時にメッセージを送信するリマインダーを設定")
 @app_commands.describe(message="改行したい場合は \\n（または ¥n）と入力してください")
 async def remind(interaction: discord.Interaction, time: str, message: str):
@@ -286,6 +511,10 @@ async def remind(interaction: discord.Interaction, time: str, message: str):
         message=message,
         remind_at=remind_at,
     )
+    reminder_scheduler.schedule(await reminder_store.get(reminder_id))
+    if isinstance(interaction.user, discord.Member):
+        # 配信時に設定者の表示名を取得し直さずに済むよう覚えておく
+        member_names.remember(interaction.user)
 
     # サーバー全体の並び順に基づく表示用番号を算出（/remind_list, /remind_cancelと共通の番号体系）
     reminders = await reminder_store.list_by_guild(interaction.guild.id)
@@ -321,11 +550,13 @@ async def remind_list(interaction: discord.Interaction, mine: bool = False):
         await interaction.response.send_message(embed=embed)
         return
 
+    # 設定者の表示名は一覧ごとに1回でまとめて取得する
+    creators = await member_names.display_names(interaction.guild, (r.user_id for _, r in numbered))
     for no, r in numbered:
         remind_at_jst = r.remind_at.astimezone(JST)
         oneline_message = r.message.replace("\n", " / ")
         preview = oneline_message if len(oneline_message) <= 50 else oneline_message[:50] + "…"
-        creator = _display_name(interaction.guild, r.user_id)
+        creator = creators[r.user_id]
         embed.add_field(
             name=f"No. {no}",
             value=f"{remind_at_jst.strftime('%Y-%m-%d %H:%M')} ・ 設定: {creator}\n{preview}",
@@ -351,6 +582,7 @@ async def remind_cancel(interaction: discord.Interaction, no: int):
 
     target = reminders[no - 1]
     await reminder_store.delete(target.id)
+    reminder_scheduler.cancel(target.id)
     oneline_message = target.message.replace("\n", " / ")
     preview = oneline_message if len(oneline_message) <= 50 else oneline_message[:50] + "…"
 
@@ -377,8 +609,9 @@ async def senryu_list(interaction: discord.Interaction):
         await interaction.response.send_message(embed=embed)
         return
 
+    authors = await member_names.display_names(interaction.guild, (s.user_id for s in senryus))
     for s in senryus:
-        author = _display_name(interaction.guild, s.user_id)
+        author = authors[s.user_id]
         haiku = f"{s.line1} / {s.line2} / {s.line3}"
         created_jst = s.created_at.astimezone(JST)
         link = f"https://discord.com/channels/{s.guild_id}/{s.channel_id}/{s.message_id}"
@@ -391,12 +624,122 @@ async def senryu_list(interaction: discord.Interaction):
     await interaction.response.send_message(embed=embed)
 
 
+BACKFILL_BATCH_SIZE = 100  # channel.history()の1ページ分
+BACKFILL_TIME_LIMIT = 10 * 60  # 1回の実行で取り込む時間の上限（秒）。インタラクションのトークンの有効期限（15分）より短くする
+
+
+async def _backfill_senryu_batch(channel, messages: list[discord.Message]) -> int:
+    """履歴の1バッチから川柳を検出して登録し、新たに登録した件数を返す"""
+    targets = [m for m in messages if not m.author.bot and m.content.strip()]
+    results = await senryu_detector.detect_many([m.content.strip() for m in targets])
+    entries = [
+        (m.id, m.author.id, lines, m.created_at)
+        for m, lines in zip(targets, results)
+        if lines
+    ]
+    # 取り込み位置も同じトランザクションで記録し、中断しても続きから再開できるようにする
+    return await senryu_store.add_many(
+        guild_id=channel.guild.id,
+        channel_id=channel.id,
+        entries=entries,
+        last_message_id=messages[-1].id,
+    )
+
+
+@bot.tree.command(name="senryu_backfill", description="チャンネルの過去ログから川柳を取り込む（管理者向け）")
+@app_commands.default_permissions(administrator=True)
+@app_commands.describe(channel="取り込むチャンネル（省略時はこのチャンネル）")
+async def senryu_backfill(interaction: discord.Interaction, channel: discord.TextChannel = None):
+    logger.info(f"[/senryu_backfill] user={interaction.user} guild={interaction.guild} channel={channel}")
+    if isinstance(interaction.channel, discord.DMChannel):
+        await interaction.response.send_message(embed=DM_REJECTED_EMBED, ephemeral=True)
+        return
+
+    await interaction.response.defer(thinking=True, ephemeral=True)
+    channel = channel or interaction.channel
+
+    last_message_id = await senryu_store.get_backfill_position(channel.id)
+    after = discord.Object(id=last_message_id) if last_message_id else None
+
+    scanned = 0
+    added = 0
+    batch = []
+    started = time.monotonic()
+    finished = False
+    try:
+        async for message in channel.history(limit=None, after=after, oldest_first=True):
+            batch.append(message)
+            if len(batch) >= BACKFILL_BATCH_SIZE:
+                added += await _backfill_senryu_batch(channel, batch)
+                scanned += len(batch)
+                batch = []
+                # インタラクションのトークンが切れる前に打ち切る（取り込み位置は記録済みなので再実行で続きから再開できる）
+                if time.monotonic() - started >= BACKFILL_TIME_LIMIT:
+                    break
+        else:
+            if batch:
+                added += await _backfill_senryu_batch(channel, batch)
+                scanned += len(batch)
+            finished = True
+    except Exception as e:
+        logger.error(f"[/senryu_backfill] 取り込みエラー channel={channel.id} scanned={scanned}: {type(e).__name__}: {e}")
+        await _backfill_reply(
+            interaction,
+            embed=_error_embed(
+                f"{channel.mention} の取り込み中にエラーが発生しました"
+                f"（{scanned}件まで取り込み済み。再実行で続きから再開します）"))
+        return
+
+    logger.info(f"[/senryu_backfill] channel={channel.id} scanned={scanned} added={added} finished={finished}")
+    message = f"{channel.mention} の過去ログ{scanned}件を確認し、川柳を{added}個取り込みました。"
+    if not finished:
+        message += "\n時間の上限に達したため中断しました。再実行すると続きから取り込みます。"
+    await _backfill_reply(interaction, content=message)
+
+
+async def _backfill_reply(
+    interaction: discord.Interaction, content: str | None = None, embed: discord.Embed | None = None
+) -> None:
+    """
+    /senryu_backfillの結果を返す。
+    インタラクションのトークンが切れてフォローアップを送れない場合は、実行したチャンネルに送る
+    """
+    try:
+        await _send("backfill_reply", interaction.followup.send(content, embed=embed, ephemeral=True))
+        return
+    except discord.HTTPException as e:
+        logger.warning(f"[/senryu_backfill] フォローアップの送信に失敗: {e}")
+    try:
+        mention = interaction.user.mention
+        await _send(
+            "backfill_reply",
+            interaction.channel.send(f"{mention} {content}" if content else mention, embed=embed))
+    except discord.HTTPException as e:
+        logger.error(f"[/senryu_backfill] 結果の送信に失敗: {e}")
+
+
+@bot.tree.command(name="sync", description="スラッシュコマンドを再同期する（管理者向け）")
+@app_commands.default_permissions(administrator=True)
+async def sync(interaction: discord.Interaction):
+    logger.info(f"[/sync] user={interaction.user} guild={interaction.guild}")
+    await interaction.response.defer(thinking=True, ephemeral=True)
+    summary = await command_syncer.sync(bot.guilds, force=True)
+    await _send("sync", interaction.followup.send(
+        f"コマンドを同期しました（成功 {summary['synced']} / 失敗 {summary['failed']}）", ephemeral=True))
+
+
 @bot.tree.command(name="dog", description="わんちゃん")
 async def dog(interaction):
+    # 先読み済みの画像があれば待たずに返答する
+    url = dog_pool.take()
+    logger.info(f"[/dog] user={interaction.user} pool={dog_pool.stats()}")
+    if url is not None:
+        await interaction.response.send_message(url)
+        return
+
     await interaction.response.defer()
-    logger.info(f"[/dog] user={interaction.user}")
-    res = API.dog()
-    await interaction.followup.send(res)
+    res = await API.dog()
+    await _send("dog", interaction.followup.send(res))
 
 # BOT_TOKENの確認
 bot_token = os.getenv('BOT_TOKEN')
@@ -405,7 +748,8 @@ if not bot_token:
     sys.exit(1)
 
 try:
-    bot.run(bot_token)
+    # ログはutils.loggerで設定済みのため、discord.pyによるルートロガーへのハンドラー追加は行わない
+    bot.run(bot_token, log_handler=None)
 except discord.LoginFailure:
     logger.error("BOT_TOKENが無効です。正しいトークンを.envファイルに設定してください。")
     sys.exit(1)
@@ -1,8 +1,10 @@
 from .parser import JST, ReminderTimeError, parse_datetime
+from .scheduler import ReminderScheduler
 from .store import Reminder, ReminderStore
 
 __all__ = [
     "ReminderStore",
+    "ReminderScheduler",
     "Reminder",
     "parse_datetime",
     "ReminderTimeError",
@@ -0,0 +1,233 @@
+"""
+リマインダーの配信スケジューラ
+
+起動時にストアから未配信のリマインダーを読み込み、配信時刻の早い順の最小ヒープで管理する。
+次のリマインダーの時刻までちょうど眠り、/remind でより早いものが追加された場合は起こされる。
+
+時刻になったら、その時点で期限を過ぎているリマインダーをストアから1つのトランザクションでまとめて確保し、
+チャンネルごとの同時送信数を守りながら並行して配信する。送信できたものはまとめて削除し、
+失敗したものは間隔を空けて再試行する。送信中にBotが落ちた場合は、次の起動時に確保を解いて配信し直す。
+"""
+import asyncio
+import dataclasses
+import heapq
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from utils import metrics
+from utils.logger import setup_logger
+
+from .store import Reminder, ReminderStore
+
+logger = setup_logger(__name__)
+
+_DELIVERY_LAG = metrics.histogram(
+    "reminder_delivery_lag_seconds", "指定時刻からリマインダーを送信し終えるまでの遅れ",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0))
+_DELIVERIES = metrics.counter(
+    "reminder_deliveries_total", "リマインダーの配信結果（ok・retry・gave_up）", ["status"])
+
+# 時計の補正（NTPなど）でずれないよう、長い待機はこの秒数ごとに起きて残り時間を計算し直す
+MAX_SLEEP_SECONDS = 300
+
+
+class ReminderScheduler:
+    """最小ヒープでリマインダーを時刻どおりに配信するスケジューラ"""
+
+    DEFAULT_CHANNEL_CONCURRENCY = 2  # 1チャンネルに同時に送信する数
+    DEFAULT_MAX_ATTEMPTS = 5  # この回数失敗したら配信を諦める
+    DEFAULT_RETRY_BACKOFF = 30.0  # 再試行までの秒数の基準。失敗するごとに倍になる
+    MAX_RETRY_BACKOFF = 3600.0
+
+    def __init__(
+        self,
+        store: ReminderStore,
+        deliver: Callable[[Reminder], Awaitable[None]],
+        clock: Callable[[], datetime] = lambda: datetime.now(timezone.utc),
+        channel_concurrency: int | None = None,
+        max_attempts: int | None = None,
+        retry_backoff: float | None = None,
+    ):
+        """
+        Args:
+            store: リマインダーのストア
+            deliver: 時刻になったリマインダーを送信する関数。例外を送出すると再試行の対象になる
+            channel_concurrency: 1チャンネルに同時に送信する数
+            max_attempts: 配信を試みる最大回数
+            retry_backoff: 再試行までの秒数の基準
+        """
+        self.store = store
+        self._deliver = deliver
+        self._clock = clock
+        self.channel_concurrency = int(
+            channel_concurrency if channel_concurrency is not None
+            else os.getenv('REMINDER_CHANNEL_CONCURRENCY', self.DEFAULT_CHANNEL_CONCURRENCY))
+        self.max_attempts = int(
+            max_attempts if max_attempts is not None
+            else os.getenv('REMINDER_MAX_ATTEMPTS', self.DEFAULT_MAX_ATTEMPTS))
+        self.retry_backoff = float(
+            retry_backoff if retry_backoff is not None
+            else os.getenv('REMINDER_RETRY_BACKOFF', self.DEFAULT_RETRY_BACKOFF))
+        self._heap: list[tuple[datetime, int]] = []
+        # 配信予定のリマインダー。キャンセルされたものはここから消し、ヒープからは取り出し時に捨てる
+        self._scheduled: dict[int, Reminder] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._batches: set[asyncio.Task] = set()
+        self._channel_semaphores: dict[int, asyncio.Semaphore] = {}
+
+    def __len__(self) -> int:
+        return len(self._scheduled)
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        """ストアから未配信のリマインダーを読み込み、配信ループを開始する"""
+        if self.is_running:
+            return
+        reset = await self.store.reset_sending()
+        for reminder in await self.store.list_pending():
+            self._scheduled[reminder.id] = reminder
+        self._heap = [(r.due_at, r.id) for r in self._scheduled.values()]
+        heapq.heapify(self._heap)
+        logger.info(f"[reminder] scheduler started pending={len(self._scheduled)} reset={reset}")
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        配信ループと送信中の配信を止める。
+        送信中だったリマインダーは'sending'のまま残り、次の起動時に配信し直される
+        """
+        tasks = [t for t in (self._task, *self._batches) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._batches.clear()
+
+    def schedule(self, reminder: Reminder) -> None:
+        """リマインダーを配信予定に加える。現在の先頭より早ければ配信ループを起こす"""
+        self._scheduled[reminder.id] = reminder
+        is_earliest = not self._heap or reminder.due_at < self._heap[0][0]
+        heapq.heappush(self._heap, (reminder.due_at, reminder.id))
+        if is_earliest:
+            self._wakeup.set()
+
+    def cancel(self, reminder_id: int) -> None:
+        """リマインダーを配信予定から外す"""
+        if self._scheduled.pop(reminder_id, None) is not None:
+            self._wakeup.set()
+
+    def next_due(self) -> datetime | None:
+        """次に配信するリマインダーの時刻"""
+        self._discard_cancelled()
+        return self._heap[0][0] if self._heap else None
+
+    async def wait_idle(self) -> None:
+        """送信中の配信がすべて終わるまで待つ"""
+        while self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+
+    def _discard_cancelled(self) -> None:
+        while self._heap and self._heap[0][1] not in self._scheduled:
+            heapq.heappop(self._heap)
+
+    async def _sleep(self, seconds: float | None) -> None:
+        """指定秒数（Noneなら無期限）か、schedule/cancelで起こされるまで待つ"""
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            due_at = self.next_due()
+            if due_at is None:
+                await self._sleep(None)
+                continue
+
+            now = self._clock()
+            delay = (due_at - now).total_seconds()
+            if delay > 0:
+                await self._sleep(min(delay, MAX_SLEEP_SECONDS))
+                continue
+
+            try:
+                reminders = await self.store.claim_due(now)
+            except Exception as e:
+                logger.error(f"[reminder] 確保エラー: {type(e).__name__}: {e}")
+                await self._sleep(self.retry_backoff)
+                continue
+
+            # 確保したものと、期限を過ぎているのにDBにない（削除済みの）ものをヒープから外す
+            for reminder in reminders:
+                self._scheduled.pop(reminder.id, None)
+            while self._heap and self._heap[0][0] <= now:
+                _, reminder_id = heapq.heappop(self._heap)
+                self._scheduled.pop(reminder_id, None)
+
+            if reminders:
+                # 送信が詰まっても次の時刻のリマインダーを待たせないよう、配信は別タスクで行う
+                task = asyncio.create_task(self._deliver_batch(reminders))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
+
+    def _channel_slot(self, channel_id: int) -> asyncio.Semaphore:
+        semaphore = self._channel_semaphores.get(channel_id)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.channel_concurrency)
+            self._channel_semaphores[channel_id] = semaphore
+        return semaphore
+
+    async def _deliver_one(self, reminder: Reminder) -> None:
+        async with self._channel_slot(reminder.channel_id):
+            await self._deliver(reminder)
+        _DELIVERY_LAG.observe(max(0.0, (self._clock() - reminder.remind_at).total_seconds()))
+
+    async def _deliver_batch(self, reminders: list[Reminder]) -> None:
+        started = self._clock()
+        results = await asyncio.gather(
+            *(self._deliver_one(r) for r in reminders), return_exceptions=True)
+
+        delivered, retries, rescheduled = [], [], []
+        for reminder, result in zip(reminders, results):
+            if not isinstance(result, BaseException):
+                delivered.append(reminder.id)
+                _DELIVERIES.inc(status="ok")
+                continue
+            attempts = reminder.attempts + 1
+            if attempts >= self.max_attempts:
+                logger.error(
+                    f"[reminder] 配信を断念 id={reminder.id} attempts={attempts}: "
+                    f"{type(result).__name__}: {result}")
+                delivered.append(reminder.id)
+                _DELIVERIES.inc(status="gave_up")
+                continue
+            _DELIVERIES.inc(status="retry")
+            backoff = min(self.retry_backoff * 2 ** (attempts - 1), self.MAX_RETRY_BACKOFF)
+            next_attempt_at = self._clock() + timedelta(seconds=backoff)
+            logger.warning(
+                f"[reminder] 配信エラー id={reminder.id} attempts={attempts} retry_in={backoff:.0f}s: "
+                f"{type(result).__name__}: {result}")
+            retries.append((reminder.id, next_attempt_at))
+            rescheduled.append(
+                dataclasses.replace(reminder, attempts=attempts, next_attempt_at=next_attempt_at))
+
+        try:
+            await self.store.mark_delivered(delivered)
+            await self.store.mark_failed(retries)
+        except Exception as e:
+            # 'sending'のまま残った分は次の起動時に配信し直される
+            logger.error(f"[reminder] 配信結果の保存エラー: {type(e).__name__}: {e}")
+            return
+        for reminder in rescheduled:
+            self.schedule(reminder)
+
+        elapsed = (self._clock() - started).total_seconds()
+        logger.info(
+            f"[reminder] done={len(delivered)} retry={len(retries)} "
+            f"batch={len(reminders)} elapsed={elapsed:.2f}s")
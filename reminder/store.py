@@ -7,9 +7,80 @@ from pathlib import Path
 
 import aiosqlite
 
+from utils.sqlite import DatabaseManager, from_epoch_ms, sql_iso_to_epoch_ms, to_epoch_ms
+
 DB_PATH = Path(__file__).resolve().parent.parent / "data" / "reminders.db"
 
 
+async def _create_reminders(db: aiosqlite.Connection) -> None:
+    """v1: 初期スキーマ（時刻はISO 8601文字列）。版管理の導入前に作られたDBではそのまま残る"""
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reminders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            message TEXT NOT NULL,
+            remind_at TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+
+
+async def _epoch_timestamps(db: aiosqlite.Connection) -> None:
+    """v2: remind_at・created_atをUNIX時間（ミリ秒）の整数列に変える"""
+    await db.execute(
+        """
+        CREATE TABLE reminders_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            message TEXT NOT NULL,
+            remind_at INTEGER NOT NULL,
+            created_at INTEGER NOT NULL
+        )
+        """
+    )
+    await db.execute(
+        "INSERT INTO reminders_new "
+        "(id, guild_id, channel_id, user_id, message, remind_at, created_at) "
+        f"SELECT id, guild_id, channel_id, user_id, message, "
+        f"{sql_iso_to_epoch_ms('remind_at')}, {sql_iso_to_epoch_ms('created_at')} FROM reminders"
+    )
+    await db.execute("DROP TABLE reminders")
+    await db.execute("ALTER TABLE reminders_new RENAME TO reminders")
+
+
+async def _add_indexes(db: aiosqlite.Connection) -> None:
+    """v3: 期限の近い順・サーバーごとの一覧を全件走査せずに引けるようにする"""
+    await db.execute("CREATE INDEX idx_reminders_remind_at ON reminders (remind_at)")
+    await db.execute("CREATE INDEX idx_reminders_guild_remind_at ON reminders (guild_id, remind_at)")
+
+
+async def _delivery_state(db: aiosqlite.Connection) -> None:
+    """
+    v4: 配信状態を持たせる。
+    配信する行はstatusを'sending'にして確保し、送信できたら削除、失敗したらnext_attempt_atを延ばして'pending'に戻す
+    """
+    await db.execute("ALTER TABLE reminders ADD COLUMN status TEXT NOT NULL DEFAULT 'pending'")
+    await db.execute("ALTER TABLE reminders ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+    await db.execute("ALTER TABLE reminders ADD COLUMN next_attempt_at INTEGER")
+    await db.execute("UPDATE reminders SET next_attempt_at = remind_at")
+    await db.execute(
+        "CREATE INDEX idx_reminders_status_next_attempt_at ON reminders (status, next_attempt_at)")
+    # 配信対象の確保は(status, next_attempt_at)で引くため、remind_at単独の索引は登録のたびの負担にしかならない
+    await db.execute("DROP INDEX IF EXISTS idx_reminders_remind_at")
+
+
+MIGRATIONS = [_create_reminders, _epoch_timestamps, _add_indexes, _delivery_state]
+
+PENDING = "pending"
+SENDING = "sending"
+
+
 @dataclass
 class Reminder:
     id: int
@@ -19,31 +90,30 @@ class Reminder:
     message: str
     remind_at: datetime  # UTC aware
     created_at: datetime  # UTC aware
+    attempts: int = 0  # 失敗した配信の回数
+    next_attempt_at: datetime | None = None  # 次に配信を試みる時刻。Noneならremind_at
+
+    @property
+    def due_at(self) -> datetime:
+        return self.next_attempt_at or self.remind_at
 
 
 class ReminderStore:
     """リマインダーのCRUDを行うSQLiteストア"""
 
-    def __init__(self, db_path: Path = DB_PATH):
+    def __init__(self, db_path: Path = DB_PATH, databases: DatabaseManager | None = None):
+        """
+        Args:
+            databases: 接続を共有するDatabaseManager。省略時はこのストア専用の接続を使う
+        """
         self.db_path = db_path
+        self.db = (databases or DatabaseManager()).get(db_path)
 
     async def init(self) -> None:
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                """
-                CREATE TABLE IF NOT EXISTS reminders (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    guild_id INTEGER NOT NULL,
-                    channel_id INTEGER NOT NULL,
-                    user_id INTEGER NOT NULL,
-                    message TEXT NOT NULL,
-                    remind_at TEXT NOT NULL,
-                    created_at TEXT NOT NULL
-                )
-                """
-            )
-            await db.commit()
+        await self.db.migrate(MIGRATIONS)
+
+    async def close(self) -> None:
+        await self.db.close()
 
     async def add(
         self,
@@ -54,36 +124,78 @@ class ReminderStore:
         remind_at: datetime,
     ) -> int:
         created_at = datetime.now(timezone.utc)
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.db.transaction() as db:
             cursor = await db.execute(
                 "INSERT INTO reminders "
-                "(guild_id, channel_id, user_id, message, remind_at, created_at) "
-                "VALUES (?, ?, ?, ?, ?, ?)",
+                "(guild_id, channel_id, user_id, message, remind_at, created_at, next_attempt_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
                 (
                     guild_id,
                     channel_id,
                     user_id,
                     message,
-                    remind_at.isoformat(),
-                    created_at.isoformat(),
+                    to_epoch_ms(remind_at),
+                    to_epoch_ms(created_at),
+                    to_epoch_ms(remind_at),
                 ),
             )
-            await db.commit()
             return cursor.lastrowid
 
-    async def get_due(self, now: datetime) -> list[Reminder]:
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+    async def claim_due(self, now: datetime) -> list[Reminder]:
+        """
+        配信時刻を過ぎた未配信のリマインダーを1つのトランザクションでまとめて'sending'にし、確保したものを返す。
+        確保したリマインダーはmark_delivered・mark_failedを呼ぶまで再び返されない。
+        """
+        async with self.db.transaction() as db:
             cursor = await db.execute(
-                "SELECT * FROM reminders WHERE remind_at <= ? ORDER BY remind_at ASC",
-                (now.isoformat(),),
+                "UPDATE reminders SET status = ? WHERE status = ? AND next_attempt_at <= ? RETURNING *",
+                (SENDING, PENDING, to_epoch_ms(now)),
             )
             rows = await cursor.fetchall()
+        reminders = [self._row_to_reminder(row) for row in rows]
+        reminders.sort(key=lambda r: (r.due_at, r.id))
+        return reminders
+
+    async def mark_delivered(self, reminder_ids: list[int]) -> None:
+        """配信済み（または再試行を諦めた）リマインダーをまとめて削除する"""
+        if not reminder_ids:
+            return
+        async with self.db.transaction() as db:
+            await db.executemany(
+                "DELETE FROM reminders WHERE id = ?", [(reminder_id,) for reminder_id in reminder_ids])
+
+    async def mark_failed(self, retries: list[tuple[int, datetime]]) -> None:
+        """
+        配信に失敗したリマインダーを'pending'に戻し、試行回数を増やす
+
+        Args:
+            retries: (reminder_id, 次に配信を試みる時刻) のリスト
+        """
+        if not retries:
+            return
+        async with self.db.transaction() as db:
+            await db.executemany(
+                "UPDATE reminders SET status = ?, attempts = attempts + 1, next_attempt_at = ? WHERE id = ?",
+                [(PENDING, to_epoch_ms(next_attempt_at), reminder_id) for reminder_id, next_attempt_at in retries],
+            )
+
+    async def reset_sending(self) -> int:
+        """配信中のまま残ったリマインダー（送信中にBotが落ちたもの）を'pending'に戻し、その件数を返す"""
+        async with self.db.transaction() as db:
+            cursor = await db.execute(
+                "UPDATE reminders SET status = ? WHERE status = ?", (PENDING, SENDING))
+            return cursor.rowcount
+
+    async def list_pending(self) -> list[Reminder]:
+        """未配信のリマインダーをすべてremind_atの早い順に返す"""
+        async with self.db.read() as db:
+            cursor = await db.execute(
+                "SELECT * FROM reminders WHERE status = ? ORDER BY next_attempt_at ASC", (PENDING,))
+            rows = await cursor.fetchall()
             return [self._row_to_reminder(row) for row in rows]
 
     async def list_by_guild(self, guild_id: int) -> list[Reminder]:
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.db.read() as db:
             cursor = await db.execute(
                 "SELECT * FROM reminders WHERE guild_id = ? ORDER BY remind_at ASC",
                 (guild_id,),
@@ -92,8 +204,7 @@ class ReminderStore:
             return [self._row_to_reminder(row) for row in rows]
 
     async def get(self, reminder_id: int) -> Reminder | None:
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.db.read() as db:
             cursor = await db.execute(
                 "SELECT * FROM reminders WHERE id = ?", (reminder_id,)
             )
@@ -101,9 +212,8 @@ class ReminderStore:
             return self._row_to_reminder(row) if row else None
 
     async def delete(self, reminder_id: int) -> None:
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.db.transaction() as db:
             await db.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
-            await db.commit()
 
     @staticmethod
     def _row_to_reminder(row: aiosqlite.Row) -> Reminder:
@@ -113,6 +223,8 @@ class ReminderStore:
             channel_id=row["channel_id"],
             user_id=row["user_id"],
             message=row["message"],
-            remind_at=datetime.fromisoformat(row["remind_at"]),
-            created_at=datetime.fromisoformat(row["created_at"]),
+            remind_at=from_epoch_ms(row["remind_at"]),
+            created_at=from_epoch_ms(row["created_at"]),
+            attempts=row["attempts"],
+            next_attempt_at=from_epoch_ms(row["next_attempt_at"]),
         )
@@ -1,9 +1,12 @@
-from .counter import is_senryu, split_575
+from .counter import is_senryu, split_575, split_575_many
+from .detector import SenryuDetector
 from .store import Senryu, SenryuStore
 
 __all__ = [
     "is_senryu",
     "split_575",
+    "split_575_many",
+    "SenryuDetector",
     "Senryu",
     "SenryuStore",
 ]
@@ -4,14 +4,19 @@
 メッセージ本文を形態素解析し、モーラ（拍）数が5-7-5になっているかを判定します。
 """
 import re
-
-from janome.tokenizer import Tokenizer
+import threading
+import time
+from concurrent.futures import Executor
+from functools import lru_cache
+from typing import Iterable
 
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
-_tokenizer = Tokenizer()
+# システム辞書の読み込みは重いため、Tokenizerは初回利用時（またはwarm_up）まで生成しない
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
 
 # 拗音を作る小書きカナ。直前の文字と合わせて1モーラなので単独ではカウントしない。
 _SMALL_YOON = set('ァィゥェォヵヶャュョ')
@@ -26,6 +31,48 @@ _TOTAL_MORA = sum(_TARGET_MORA)
 _BOUNDARY_1 = _TARGET_MORA[0]
 _BOUNDARY_2 = _TARGET_MORA[0] + _TARGET_MORA[1]
 
+# モーラ数の上下限を文字種から見積もるための定義。
+# 係数はjanomeのシステム辞書の全エントリについて、表層形の文字種と読みのモーラ数を照合して求めた値で、
+# どの単語の組み合わせでも「下限 <= 実際のモーラ数 <= 上限」が成り立つ。
+#   かな   : 上限1（辞書の一部に読みが表層より短い語があるため、下限は漢字と合わせて0.5）
+#   小書き : 0〜1
+#   漢字   : 0.5〜7（例: 海布=メ、糎=センチメートル）
+#   その他 : 0〜8（例: 〒=ユウビンバンゴウ。全角英数・記号など）
+_SMALL_KANA = set('ぁぃぅぇぉゃゅょゎゕゖァィゥェォャュョヮヵヶ')
+_KANJI_UPPER_MORA = 7
+_OTHER_UPPER_MORA = 8
+# 辞書の表層形に現れるASCII文字。それ以外のASCII文字（英字・空白など）や絵文字などの
+# BMP外の文字は辞書に存在せず未知語になるため、その文は読みが解決できない
+_DICTIONARY_ASCII = set('12Tf[]')
+
+# 文 -> トークン列 のLRUキャッシュの上限。定型文やコピペの連投はjanomeを通さずに済む
+TOKEN_CACHE_SIZE = 4096
+
+
+def _get_tokenizer():
+    """Tokenizerを返す。未生成ならシステム辞書をmmapモードで開いて生成する"""
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                # janome自体のimportも辞書データを読み込むため、ここまで遅らせる
+                from janome.tokenizer import Tokenizer
+                _tokenizer = Tokenizer(mmap=True)
+    return _tokenizer
+
+
+def is_ready() -> bool:
+    """Tokenizerが生成済みかどうか"""
+    return _tokenizer is not None
+
+
+def warm_up() -> None:
+    """Tokenizerを生成し、一度解析して辞書のページを読み込んでおく"""
+    started = time.perf_counter()
+    for _ in _get_tokenizer().tokenize('古池や蛙飛び込む水の音'):
+        pass
+    logger.info(f"[senryu] 形態素解析の準備完了 ({time.perf_counter() - started:.2f}秒)")
+
 
 def count_mora(reading: str) -> int:
     """カタカナ読みからモーラ数を数える"""
@@ -46,10 +93,50 @@ def _is_kana(text: str) -> bool:
     )
 
 
+def _is_plain_kana(ch: str) -> bool:
+    return 'ぁ' <= ch <= 'ゖ' or 'ァ' <= ch <= 'ヺ' or ch == 'ー'
+
+
+def _is_kanji(ch: str) -> bool:
+    return '一' <= ch <= '鿿' or '㐀' <= ch <= '䶿' or ch in '々〆〇'
+
+
+def _mora_bounds(sentence: str):
+    """
+    形態素解析をせずに、文字種だけから文のモーラ数の(下限, 上限)を見積もる。
+    読みが解決できないこと（_tokenizeがNoneを返すこと）が確実な文はNoneを返す。
+    """
+    half_lower = 0
+    upper = 0
+    for ch in sentence:
+        if ch in _SMALL_KANA:
+            upper += 1
+        elif _is_plain_kana(ch):
+            half_lower += 1
+            upper += 1
+        elif _is_kanji(ch):
+            half_lower += 1
+            upper += _KANJI_UPPER_MORA
+        elif (ch.isascii() and ch not in _DICTIONARY_ASCII) or ch > '\uffff':
+            return None
+        else:
+            upper += _OTHER_UPPER_MORA
+    return (half_lower + 1) // 2, upper
+
+
+def _may_have_mora(bounds, mora: int) -> bool:
+    """_mora_boundsの見積もり上、文がちょうどmoraモーラになり得るか"""
+    return bounds is not None and bounds[0] <= mora <= bounds[1]
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
 def _tokenize(text: str):
-    """トークンごとの(表層形, モーラ数)のリストを返す。読みが解決できないトークンがあればNoneを返す"""
+    """
+    トークンごとの(表層形, モーラ数)のタプルを返す。読みが解決できないトークンがあればNoneを返す。
+    結果はキャッシュで共有されるため、変更されないようタプルで返す。
+    """
     result = []
-    for token in _tokenizer.tokenize(text):
+    for token in _get_tokenizer().tokenize(text):
         reading = token.reading
         if reading == '*':
             if _is_kana(token.surface):
@@ -57,7 +144,19 @@ def _tokenize(text: str):
             else:
                 return None
         result.append((token.surface, count_mora(reading)))
-    return result
+    return tuple(result)
+
+
+def token_cache_info():
+    """トークンキャッシュのヒット・ミス数（functools.lru_cacheのcache_info）を返す"""
+    return _tokenize.cache_info()
+
+
+def _tokens_for(table: dict, sentence: str):
+    """メッセージ単位のトークン表から文の解析結果を引く。未登録なら解析して登録する"""
+    if sentence not in table:
+        table[sentence] = _tokenize(sentence)
+    return table[sentence]
 
 
 def _sentences(text: str):
@@ -65,18 +164,17 @@ def _sentences(text: str):
     return [s.strip() for s in _SENTENCE_SPLIT_RE.split(text) if s.strip()]
 
 
-def _match_three_sentences(sentences):
+def _match_three_sentences(sentences, table: dict):
     """連続する3文がそれぞれ5・7・5モーラならその3文をそのまま返す"""
     for sentence, expected in zip(sentences, _TARGET_MORA):
-        tokens = _tokenize(sentence)
+        tokens = _tokens_for(table, sentence)
         if tokens is None or sum(m for _, m in tokens) != expected:
             return None
     return list(sentences[:3])
 
 
-def _split_sentence(text: str):
-    """1文を単語境界に沿って5・7・5モーラの3行に分割して返す"""
-    tokens = _tokenize(text)
+def _split_sentence(text: str, tokens):
+    """解析済みの1文を単語境界に沿って5・7・5モーラの3行に分割して返す"""
     if tokens is None:
         return None
 
@@ -122,13 +220,23 @@ def split_575(text: str):
         if not sentences:
             return None
 
+        # 文字種から見積もったモーラ数の範囲で、5・7・5や17になり得ない文は解析前に除外する
+        bounds = [_mora_bounds(s) for s in sentences]
+
+        # 重なり合う3文の窓と単文の判定で同じ文を何度も解析しないよう、メッセージ内で結果を共有する
+        table = {}
+
         for i in range(len(sentences) - 2):
-            matched = _match_three_sentences(sentences[i:i + 3])
+            if not all(_may_have_mora(b, m) for b, m in zip(bounds[i:i + 3], _TARGET_MORA)):
+                continue
+            matched = _match_three_sentences(sentences[i:i + 3], table)
             if matched is not None:
                 return matched
 
-        for sentence in sentences:
-            result = _split_sentence(sentence)
+        for sentence, sentence_bounds in zip(sentences, bounds):
+            if not _may_have_mora(sentence_bounds, _TOTAL_MORA):
+                continue
+            result = _split_sentence(sentence, _tokens_for(table, sentence))
             if result is not None:
                 return result
 
@@ -138,6 +246,18 @@ def split_575(text: str):
         return None
 
 
+def split_575_many(texts: Iterable[str], executor: Executor | None = None, chunk_size: int = 100):
+    """
+    複数のテキストをまとめて判定し、入力順にsplit_575の結果のリストを返す。
+    executorを渡すとchunk_size件ずつワーカープールに分配して判定する。
+    """
+    texts = list(texts)
+    if executor is None:
+        return [split_575(text) for text in texts]
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    return [result for chunk in executor.map(split_575_many, chunks) for result in chunk]
+
+
 def is_senryu(text: str) -> bool:
     """テキストが5-7-5（モーラ数・単語境界基準）かどうかを判定する"""
     return split_575(text) is not None
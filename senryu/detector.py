@@ -0,0 +1,91 @@
+"""
+川柳検出の非同期サービス
+
+janomeによる形態素解析はCPUを使うため、イベントループ上で直接実行すると
+ハートビートや他のコマンド応答が遅れます。解析をワーカースレッドで実行し、
+呼び出し側は結果をawaitするだけで済むようにします。
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import metrics
+from utils.logger import setup_logger
+
+from .counter import split_575, split_575_many, warm_up
+
+logger = setup_logger(__name__)
+
+_DETECT_SECONDS = metrics.histogram(
+    "senryu_detect_seconds", "川柳検出の所要時間（ワーカーの待ち時間を含む）", ["result"])
+_DROPPED = metrics.counter("senryu_dropped_total", "混雑のため解析せずに破棄したメッセージ数")
+
+
+class SenryuDetector:
+    """split_575をワーカープールで実行する検出サービス"""
+
+    def __init__(self, max_workers: int = 1, max_pending: int = 100, batch_workers: int = 2):
+        """
+        Args:
+            max_workers: 解析に使うワーカースレッド数
+            max_pending: 同時に受け付ける解析待ち件数の上限。超えた分は解析せずに破棄する
+            batch_workers: detect_manyでの一括解析に使うワーカースレッド数
+        """
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._pending = 0
+        self._warm_up = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="senryu")
+        # 履歴の一括解析でon_messageの検出が待たされないよう、ワーカーを分けておく
+        self._batch_executor = ThreadPoolExecutor(
+            max_workers=batch_workers, thread_name_prefix="senryu-batch")
+
+    @property
+    def queue_depth(self) -> int:
+        """解析中・解析待ちの件数"""
+        return self._pending
+
+    def warm_up(self) -> None:
+        """
+        形態素解析器の初期化をワーカーで開始する。
+        完了前に届いたメッセージはワーカーの待ち行列で初期化の完了を待つため、イベントループは止まらない。
+        """
+        if self._warm_up is None:
+            self._warm_up = self._executor.submit(warm_up)
+
+    async def detect(self, text: str) -> list[str] | None:
+        """
+        split_575と同じ結果を返す。
+        解析待ちが上限に達している場合は混雑中とみなし、解析せずにNoneを返す。
+        """
+        if self._pending >= self.max_pending:
+            self.dropped += 1
+            _DROPPED.inc()
+            logger.warning(
+                f"[senryu] 解析待ちが上限に達したため破棄 depth={self._pending} dropped={self.dropped}")
+            return None
+
+        self._pending += 1
+        started = time.perf_counter()
+        lines = None
+        try:
+            loop = asyncio.get_running_loop()
+            lines = await loop.run_in_executor(self._executor, split_575, text)
+            return lines
+        finally:
+            self._pending -= 1
+            _DETECT_SECONDS.observe(time.perf_counter() - started, result="senryu" if lines else "none")
+
+    async def detect_many(self, texts: list[str]) -> list[list[str] | None]:
+        """
+        複数のテキストをまとめて判定し、入力順に結果を返す（過去ログの取り込み用）。
+        detectと違い、待ちが多くても破棄はしない。
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, split_575_many, texts, self._batch_executor)
+
+    def close(self) -> None:
+        """ワーカーを停止する。未着手の解析はキャンセルされる"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._batch_executor.shutdown(wait=False, cancel_futures=True)
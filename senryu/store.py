@@ -1,15 +1,124 @@
 """
 川柳のSQLiteによる永続化
+
+書き込みの遅延（write-behind）を有効にすると、add()は件数だけをメモリ上で数えてすぐに返し、
+登録は一定件数・一定時間ごとに1つのトランザクションにまとめてSQLiteに書き込む。
 """
+import asyncio
+import os
+from collections import Counter
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from itertools import groupby
 from pathlib import Path
 
 import aiosqlite
 
+from utils.logger import setup_logger
+from utils.sqlite import DatabaseManager, from_epoch_ms, sql_iso_to_epoch_ms, to_epoch_ms
+
+logger = setup_logger(__name__)
+
 DB_PATH = Path(__file__).resolve().parent.parent / "data" / "senryu.db"
 
 
+async def _create_senryus(db: aiosqlite.Connection) -> None:
+    """v1: 初期スキーマ（時刻はISO 8601文字列）。版管理の導入前に作られたDBではそのまま残る"""
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS senryus (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            line1 TEXT NOT NULL,
+            line2 TEXT NOT NULL,
+            line3 TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    # 過去ログの取り込みを再実行しても同じメッセージを二重登録しないようにする
+    await db.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_senryus_message_id ON senryus (message_id)"
+    )
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS senryu_backfill (
+            channel_id INTEGER PRIMARY KEY,
+            last_message_id INTEGER NOT NULL
+        )
+        """
+    )
+
+
+async def _epoch_timestamps(db: aiosqlite.Connection) -> None:
+    """v2: created_atをUNIX時間（ミリ秒）の整数列に変える"""
+    await db.execute(
+        """
+        CREATE TABLE senryus_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            line1 TEXT NOT NULL,
+            line2 TEXT NOT NULL,
+            line3 TEXT NOT NULL,
+            created_at INTEGER NOT NULL
+        )
+        """
+    )
+    await db.execute(
+        "INSERT INTO senryus_new "
+        "(id, guild_id, channel_id, user_id, message_id, line1, line2, line3, created_at) "
+        "SELECT id, guild_id, channel_id, user_id, message_id, line1, line2, line3, "
+        f"{sql_iso_to_epoch_ms('created_at')} FROM senryus"
+    )
+    await db.execute("DROP TABLE senryus")
+    await db.execute("ALTER TABLE senryus_new RENAME TO senryus")
+    await db.execute("CREATE UNIQUE INDEX idx_senryus_message_id ON senryus (message_id)")
+
+
+async def _add_indexes(db: aiosqlite.Connection) -> None:
+    """v3: サーバーごとの件数・新しい順の一覧を全件走査せずに引けるようにする"""
+    await db.execute("CREATE INDEX idx_senryus_guild_created_at ON senryus (guild_id, created_at)")
+
+
+async def _guild_counts(db: aiosqlite.Connection) -> None:
+    """
+    v4: サーバーごとの川柳の件数を持つテーブル。登録と同じトランザクションで増やし、
+    登録のたびにCOUNT(*)しなくて済むようにする。既存のDBでは現在の件数から作り直す
+    """
+    await db.execute(
+        """
+        CREATE TABLE guild_senryu_counts (
+            guild_id INTEGER PRIMARY KEY,
+            count INTEGER NOT NULL
+        )
+        """
+    )
+    await db.execute(
+        "INSERT INTO guild_senryu_counts (guild_id, count) "
+        "SELECT guild_id, COUNT(*) FROM senryus GROUP BY guild_id"
+    )
+
+
+MIGRATIONS = [_create_senryus, _epoch_timestamps, _add_indexes, _guild_counts]
+
+_INSERT_SENRYU = (
+    "INSERT INTO senryus "
+    "(guild_id, channel_id, user_id, message_id, line1, line2, line3, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_INSERT_SENRYU_OR_IGNORE = _INSERT_SENRYU.replace("INSERT INTO", "INSERT OR IGNORE INTO", 1)
+_INCREMENT_COUNT = (
+    "INSERT INTO guild_senryu_counts (guild_id, count) VALUES (?, ?) "
+    "ON CONFLICT (guild_id) DO UPDATE SET count = count + excluded.count RETURNING count"
+)
+
+
 @dataclass
 class Senryu:
     id: int
@@ -26,28 +135,75 @@ class Senryu:
 class SenryuStore:
     """検出した川柳のCRUDを行うSQLiteストア"""
 
-    def __init__(self, db_path: Path = DB_PATH):
+    DEFAULT_FLUSH_ROWS = 100  # write-behindで、この件数たまったらすぐに書き込む
+    DEFAULT_FLUSH_INTERVAL_MS = 200  # write-behindで、最初の登録からこのミリ秒以内に書き込む
+
+    def __init__(
+        self,
+        db_path: Path = DB_PATH,
+        databases: DatabaseManager | None = None,
+        write_behind: bool | None = None,
+        flush_rows: int | None = None,
+        flush_interval_ms: float | None = None,
+    ):
+        """
+        Args:
+            databases: 接続を共有するDatabaseManager。省略時はこのストア専用の接続を使う
+            write_behind: add()の書き込みを遅延させてまとめるか
+            flush_rows: write-behindで、この件数たまったら書き込む
+            flush_interval_ms: write-behindで、登録からこのミリ秒以内に書き込む
+        """
         self.db_path = db_path
+        self.db = (databases or DatabaseManager()).get(db_path)
+        self.write_behind = (
+            write_behind if write_behind is not None
+            else os.getenv('SENRYU_WRITE_BEHIND', 'false').lower() == 'true')
+        self.flush_rows = int(
+            flush_rows if flush_rows is not None
+            else os.getenv('SENRYU_FLUSH_ROWS', self.DEFAULT_FLUSH_ROWS))
+        self.flush_interval = float(
+            flush_interval_ms if flush_interval_ms is not None
+            else os.getenv('SENRYU_FLUSH_INTERVAL_MS', self.DEFAULT_FLUSH_INTERVAL_MS)) / 1000
+        # サーバーごとの件数。guild_senryu_countsの値に、まだ書き込んでいない登録の数を足したもの
+        self._counts: dict[int, int] = {}
+        # write-behindでまだ書き込んでいない登録（_INSERT_SENRYUのパラメータ）と、そのサーバーごとの件数
+        self._pending: list[tuple] = []
+        self._pending_counts: Counter[int] = Counter()
+        self._flush_timer: asyncio.Task | None = None
+        self._flush_tasks: set[asyncio.Task] = set()
+        self._closed = False
 
     async def init(self) -> None:
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                """
-                CREATE TABLE IF NOT EXISTS senryus (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    guild_id INTEGER NOT NULL,
-                    channel_id INTEGER NOT NULL,
-                    user_id INTEGER NOT NULL,
-                    message_id INTEGER NOT NULL,
-                    line1 TEXT NOT NULL,
-                    line2 TEXT NOT NULL,
-                    line3 TEXT NOT NULL,
-                    created_at TEXT NOT NULL
-                )
-                """
-            )
-            await db.commit()
+        await self.db.migrate(MIGRATIONS)
+        async with self.db.read() as db:
+            cursor = await db.execute("SELECT guild_id, count FROM guild_senryu_counts")
+            self._counts = {row[0]: row[1] for row in await cursor.fetchall()}
+
+    async def close(self) -> None:
+        """書き込んでいない登録をすべて書き込んでから接続を閉じる。以降の登録は受け付けない"""
+        self._closed = True
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        try:
+            await self.flush()
+        finally:
+            await self.db.close()
+
+    @property
+    def pending(self) -> int:
+        """write-behindでまだ書き込んでいない登録の件数"""
+        return len(self._pending)
+
+    def _check_open(self) -> None:
+        # 閉じた後の登録は、書き込み待ちに積んでも書き込まれず、接続も開き直してしまうため拒否する
+        if self._closed:
+            raise RuntimeError("SenryuStore is closed")
+
+    def _set_count(self, guild_id: int, committed: int) -> None:
+        self._counts[guild_id] = committed + self._pending_counts[guild_id]
 
     async def add(
         self,
@@ -57,43 +213,148 @@ class SenryuStore:
         message_id: int,
         lines: list[str],
     ) -> int:
-        """川柳を登録し、そのサーバーで何個目の川柳かを返す"""
+        """
+        川柳を登録し、そのサーバーで何個目の川柳かを返す。
+        write-behindでは書き込みを待たずに返す（同じメッセージの重複登録は書き込み時に無視される）
+        """
+        self._check_open()
         created_at = datetime.now(timezone.utc)
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                "INSERT INTO senryus "
-                "(guild_id, channel_id, user_id, message_id, line1, line2, line3, created_at) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                (
-                    guild_id,
-                    channel_id,
-                    user_id,
-                    message_id,
-                    lines[0],
-                    lines[1],
-                    lines[2],
-                    created_at.isoformat(),
-                ),
+        params = (
+            guild_id,
+            channel_id,
+            user_id,
+            message_id,
+            lines[0],
+            lines[1],
+            lines[2],
+            to_epoch_ms(created_at),
+        )
+        if self.write_behind:
+            self._pending.append(params)
+            self._pending_counts[guild_id] += 1
+            count = self._counts.get(guild_id, 0) + 1
+            self._counts[guild_id] = count
+            self._schedule_flush()
+            return count
+
+        async with self.db.transaction() as db:
+            await db.execute(_INSERT_SENRYU, params)
+            cursor = await db.execute(_INCREMENT_COUNT, (guild_id, 1))
+            committed = (await cursor.fetchone())[0]
+        self._set_count(guild_id, committed)
+        return self._counts[guild_id]
+
+    def _schedule_flush(self) -> None:
+        if len(self._pending) >= self.flush_rows:
+            self._start_flush()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        self._flush_timer = None
+        self._start_flush()
+
+    def _start_flush(self) -> None:
+        task = asyncio.create_task(self._flush_in_background())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush_in_background(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            # 失敗した分は書き込み待ちに戻っているので、次の登録か終了時に書き込み直す
+            logger.error(f"[senryu] 書き込みエラー pending={len(self._pending)}: {type(e).__name__}: {e}")
+
+    async def flush(self) -> None:
+        """write-behindでたまった登録を1つのトランザクションで書き込む"""
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        rows.sort(key=lambda row: row[0])
+        committed = {}
+        try:
+            async with self.db.transaction() as db:
+                for guild_id, guild_rows in groupby(rows, key=lambda row: row[0]):
+                    before = db.total_changes
+                    await db.executemany(_INSERT_SENRYU_OR_IGNORE, list(guild_rows))
+                    cursor = await db.execute(_INCREMENT_COUNT, (guild_id, db.total_changes - before))
+                    committed[guild_id] = (await cursor.fetchone())[0]
+        except BaseException:
+            self._pending = rows + self._pending
+            raise
+
+        for guild_id, guild_rows in groupby(rows, key=lambda row: row[0]):
+            self._pending_counts[guild_id] -= len(list(guild_rows))
+            if self._pending_counts[guild_id] <= 0:
+                del self._pending_counts[guild_id]
+            self._set_count(guild_id, committed[guild_id])
+
+    async def add_many(
+        self,
+        guild_id: int,
+        channel_id: int,
+        entries: list[tuple[int, int, list[str], datetime]],
+        last_message_id: int | None = None,
+    ) -> int:
+        """
+        過去ログから検出した川柳をまとめて登録し、新たに登録した件数を返す。
+
+        Args:
+            entries: (message_id, user_id, lines, created_at) のリスト。登録済みのメッセージは無視する
+            last_message_id: 指定すると、同じトランザクションでチャンネルの取り込み位置として記録する
+        """
+        self._check_open()
+        await self.flush()
+        async with self.db.transaction() as db:
+            before = db.total_changes
+            await db.executemany(
+                _INSERT_SENRYU_OR_IGNORE,
+                [
+                    (
+                        guild_id,
+                        channel_id,
+                        user_id,
+                        message_id,
+                        lines[0],
+                        lines[1],
+                        lines[2],
+                        to_epoch_ms(created_at),
+                    )
+                    for message_id, user_id, lines, created_at in entries
+                ],
             )
-            await db.commit()
+            added = db.total_changes - before
+            count = None
+            if added:
+                cursor = await db.execute(_INCREMENT_COUNT, (guild_id, added))
+                count = (await cursor.fetchone())[0]
+            if last_message_id is not None:
+                await db.execute(
+                    "INSERT INTO senryu_backfill (channel_id, last_message_id) VALUES (?, ?) "
+                    "ON CONFLICT (channel_id) DO UPDATE SET last_message_id = excluded.last_message_id",
+                    (channel_id, last_message_id),
+                )
+        if count is not None:
+            self._set_count(guild_id, count)
+        return added
 
+    async def get_backfill_position(self, channel_id: int) -> int | None:
+        """チャンネルの過去ログをどのメッセージIDまで取り込んだかを返す。未取り込みならNone"""
+        async with self.db.read() as db:
             cursor = await db.execute(
-                "SELECT COUNT(*) FROM senryus WHERE guild_id = ?", (guild_id,)
+                "SELECT last_message_id FROM senryu_backfill WHERE channel_id = ?", (channel_id,)
             )
             row = await cursor.fetchone()
-            return row[0]
+            return row[0] if row else None
 
     async def count_by_guild(self, guild_id: int) -> int:
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT COUNT(*) FROM senryus WHERE guild_id = ?", (guild_id,)
-            )
-            row = await cursor.fetchone()
-            return row[0]
+        return self._counts.get(guild_id, 0)
 
     async def recent_by_guild(self, guild_id: int, limit: int = 5) -> list[Senryu]:
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        await self.flush()
+        async with self.db.read() as db:
             cursor = await db.execute(
                 "SELECT * FROM senryus WHERE guild_id = ? ORDER BY created_at DESC LIMIT ?",
                 (guild_id, limit),
@@ -102,8 +363,8 @@ class SenryuStore:
             return [self._row_to_senryu(row) for row in rows]
 
     async def list_by_guild(self, guild_id: int) -> list[Senryu]:
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        await self.flush()
+        async with self.db.read() as db:
             cursor = await db.execute(
                 "SELECT * FROM senryus WHERE guild_id = ? ORDER BY created_at ASC",
                 (guild_id,),
@@ -122,5 +383,5 @@ class SenryuStore:
             line1=row["line1"],
             line2=row["line2"],
             line3=row["line3"],
-            created_at=datetime.fromisoformat(row["created_at"]),
+            created_at=from_epoch_ms(row["created_at"]),
         )
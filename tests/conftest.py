@@ -0,0 +1,4 @@
+import os
+
+# テストの実行でリポジトリのlogs/bot.logに書き込まないようにする（ロガーを作る前に設定する）
+os.environ.setdefault('LOG_TO_FILE', 'false')
@@ -0,0 +1,165 @@
+import asyncio
+
+import pytest
+
+from ai import AIError, AIManager
+
+
+class FakeGrokClient:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.running = 0
+        self.max_running = 0
+
+    async def send_message(self, message, image_url=None, conversation_key=None):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+            return f"re: {message}"
+        finally:
+            self.running -= 1
+
+
+@pytest.fixture
+def make_manager(monkeypatch):
+    def make(**env):
+        monkeypatch.setenv('XAI_API_KEY', 'test-key')
+        monkeypatch.delenv('PERPLEXITY_API_KEY', raising=False)
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+        return AIManager()
+    return make
+
+
+def test_send_message_limits_concurrency_per_guild(make_manager):
+    manager = make_manager(AI_MAX_CONCURRENCY='8', AI_MAX_CONCURRENCY_PER_GUILD='2')
+    manager.grok_client = FakeGrokClient(delay=0.01)
+
+    async def scenario():
+        return await asyncio.gather(
+            *(manager.send_message(str(i), guild_id=1) for i in range(6)))
+
+    assert asyncio.run(scenario()) == [f"re: {i}" for i in range(6)]
+    assert manager.grok_client.max_running == 2
+
+
+def test_idle_guild_slots_are_released(make_manager):
+    manager = make_manager(AI_MAX_CONCURRENCY='8', AI_MAX_CONCURRENCY_PER_GUILD='1')
+    manager.grok_client = FakeGrokClient(delay=0.01)
+
+    async def scenario():
+        first = asyncio.create_task(manager.send_message('a', guild_id=1))
+        second = asyncio.create_task(manager.send_message('b', guild_id=1))
+        await asyncio.sleep(0)
+        # 待機中の呼び出しがいる間は同じ枠を共有する
+        busy = len(manager._guild_semaphores)
+        await asyncio.gather(first, second, *(manager.send_message('c', guild_id=i) for i in range(100)))
+        return busy
+
+    assert asyncio.run(scenario()) == 1
+    assert manager._guild_semaphores == {}
+
+
+def test_send_message_limits_global_concurrency(make_manager):
+    manager = make_manager(AI_MAX_CONCURRENCY='3', AI_MAX_CONCURRENCY_PER_GUILD='2')
+    manager.grok_client = FakeGrokClient(delay=0.01)
+
+    async def scenario():
+        await asyncio.gather(
+            *(manager.send_message(str(i), guild_id=i % 4) for i in range(12)))
+
+    asyncio.run(scenario())
+    assert manager.grok_client.max_running == 3
+
+
+def test_send_message_raises_ai_error_on_timeout(make_manager):
+    manager = make_manager(AI_TIMEOUT='0.01')
+    manager.grok_client = FakeGrokClient(delay=1)
+
+    with pytest.raises(AIError):
+        asyncio.run(manager.send_message('hello', guild_id=1))
+
+
+def test_search_without_perplexity_raises_ai_error(make_manager):
+    manager = make_manager()
+
+    with pytest.raises(AIError):
+        asyncio.run(manager.search('今日の天気'))
+
+
+class FakeStreamingGrokClient:
+    def __init__(self, deltas, error=None):
+        self.deltas = deltas
+        self.error = error
+
+    async def stream_message(self, message, image_url=None, conversation_key=None):
+        for delta in self.deltas:
+            yield delta
+        if self.error:
+            raise self.error
+
+
+def test_stream_message_yields_deltas(make_manager):
+    manager = make_manager()
+    manager.grok_client = FakeStreamingGrokClient(['こん', 'にちは'])
+
+    async def scenario():
+        return [delta async for delta in manager.stream_message('hi', guild_id=1, channel_id=2)]
+
+    assert asyncio.run(scenario()) == ['こん', 'にちは']
+
+
+def test_stream_message_wraps_errors_in_ai_error(make_manager):
+    manager = make_manager()
+    manager.grok_client = FakeStreamingGrokClient(['途中'], error=RuntimeError('boom'))
+
+    async def scenario():
+        received = []
+        with pytest.raises(AIError):
+            async for delta in manager.stream_message('hi', guild_id=1):
+                received.append(delta)
+        return received
+
+    assert asyncio.run(scenario()) == ['途中']
+
+
+class _FakeStream:
+    """responses.create(stream=True)の戻り値の代わり。閉じられたかを記録する"""
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.closed = True
+
+    async def __aiter__(self):
+        for delta in self.deltas:
+            yield type('Event', (), {'type': 'response.output_text.delta', 'delta': delta})()
+
+
+def test_grok_stream_is_closed_when_iteration_stops_early(monkeypatch):
+    from ai.clients.grok import GrokClient
+
+    monkeypatch.setenv('XAI_API_KEY', 'test-key')
+    client = GrokClient()
+    stream = _FakeStream(['古池や', '蛙飛び込む', '水の音'])
+
+    async def create(**kwargs):
+        return stream
+
+    monkeypatch.setattr(client.client.responses, 'create', create)
+
+    async def scenario():
+        deltas = client.stream_message('hi', conversation_key=1)
+        first = await deltas.__anext__()
+        # 送信側のエラーやタイムアウトで途中で打ち切られた場合
+        await deltas.aclose()
+        return first
+
+    assert asyncio.run(scenario()) == '古池や'
+    assert stream.closed
@@ -0,0 +1,39 @@
+import asyncio
+
+from api import DogImagePool
+
+
+class FakeAPI:
+    def __init__(self):
+        self.fetched = 0
+
+    async def random_dog_url(self):
+        self.fetched += 1
+        return f'https://images.dog.ceo/{self.fetched}.jpg'
+
+
+def test_pool_refills_in_background_and_serves_from_buffer():
+    api = FakeAPI()
+    pool = DogImagePool(api, size=3, refill_interval=0, validate=False)
+
+    async def scenario():
+        pool.start()
+        await asyncio.sleep(0.01)
+        buffered = len(pool)
+        url = pool.take()
+        await asyncio.sleep(0.01)
+        await pool.close()
+        return buffered, url, len(pool)
+
+    buffered, url, refilled = asyncio.run(scenario())
+    assert buffered == 3
+    assert url == 'https://images.dog.ceo/1.jpg'
+    assert refilled == 3
+    assert pool.stats()['hits'] == 1
+
+
+def test_empty_pool_counts_a_miss():
+    pool = DogImagePool(FakeAPI(), size=3, refill_interval=0, validate=False)
+    # 空のときはNoneを返し、/dogがその場でAPIを呼ぶ
+    assert pool.take() is None
+    assert pool.stats() == {'buffered': 0, 'size': 3, 'hits': 0, 'misses': 1}
@@ -0,0 +1,113 @@
+import asyncio
+
+import discord
+from discord import app_commands
+
+from utils.command_sync import CommandSyncer
+
+
+def _tree(application_id=1):
+    client = discord.Client(intents=discord.Intents.none(), application_id=application_id)
+    tree = app_commands.CommandTree(client)
+
+    @tree.command(name='ping', description='pong')
+    async def ping(interaction: discord.Interaction):
+        pass
+
+    return tree
+
+
+class _FakeSync:
+    """tree.syncの代わりに呼び出しを記録する"""
+
+    def __init__(self, fail_guilds=()):
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.fail_guilds = set(fail_guilds)
+
+    async def __call__(self, *, guild=None):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        if guild is not None and guild.id in self.fail_guilds:
+            raise discord.HTTPException(_Response(), 'rate limited')
+        self.calls.append(guild.id if guild else 'global')
+        return []
+
+
+class _Response:
+    status = 429
+    reason = 'Too Many Requests'
+
+
+GUILDS = [discord.Object(id=i) for i in range(1, 7)]
+
+
+def test_sync_skips_unchanged_scopes(tmp_path):
+    tree = _tree()
+    fake = _FakeSync()
+    tree.sync = fake
+    syncer = CommandSyncer(tree, tmp_path / 'command_tree.json', concurrency=2)
+
+    first = asyncio.run(syncer.sync(GUILDS))
+    calls = len(fake.calls)
+    # 再接続・再起動しても定義が同じなら同期しない
+    restarted = CommandSyncer(tree, tmp_path / 'command_tree.json', concurrency=2)
+    second = asyncio.run(restarted.sync(GUILDS))
+
+    assert first == {'synced': 7, 'skipped': 0, 'failed': 0}
+    assert calls == 7
+    assert fake.peak == 2
+    assert second == {'synced': 0, 'skipped': 7, 'failed': 0}
+    assert len(fake.calls) == 7
+
+
+def test_sync_runs_again_when_commands_change_or_forced(tmp_path):
+    tree = _tree()
+    fake = _FakeSync()
+    tree.sync = fake
+    syncer = CommandSyncer(tree, tmp_path / 'command_tree.json')
+    asyncio.run(syncer.sync(GUILDS[:1]))
+
+    @tree.command(name='pong', description='ping')
+    async def pong(interaction: discord.Interaction):
+        pass
+
+    changed = asyncio.run(syncer.sync(GUILDS[:1]))
+    forced = asyncio.run(syncer.sync(GUILDS[:1], force=True))
+
+    # グローバルのコマンドだけが変わったので、サーバーは同期しない
+    assert changed == {'synced': 1, 'skipped': 1, 'failed': 0}
+    assert forced == {'synced': 2, 'skipped': 0, 'failed': 0}
+
+
+def test_failed_scopes_are_retried_next_time(tmp_path):
+    tree = _tree()
+    tree.sync = _FakeSync(fail_guilds={2})
+    syncer = CommandSyncer(tree, tmp_path / 'command_tree.json')
+    first = asyncio.run(syncer.sync(GUILDS[:2]))
+
+    tree.sync = _FakeSync()
+    second = asyncio.run(syncer.sync(GUILDS[:2]))
+
+    assert first == {'synced': 2, 'skipped': 0, 'failed': 1}
+    assert second == {'synced': 1, 'skipped': 2, 'failed': 0}
+    assert tree.sync.calls == [2]
+
+
+def test_state_is_kept_per_application(tmp_path):
+    production = _tree(application_id=1)
+    production.sync = _FakeSync()
+    staging = _tree(application_id=2)
+    staging.sync = _FakeSync()
+
+    asyncio.run(CommandSyncer(production, tmp_path / 'command_tree.json').sync(GUILDS[:1]))
+    # 同じ状態ファイルでも、別のBotでは同期済みとみなさない
+    summary = asyncio.run(CommandSyncer(staging, tmp_path / 'command_tree.json').sync(GUILDS[:1]))
+    again = asyncio.run(CommandSyncer(production, tmp_path / 'command_tree.json').sync(GUILDS[:1]))
+
+    assert summary == {'synced': 2, 'skipped': 0, 'failed': 0}
+    assert staging.sync.calls == ['global', 1]
+    assert again == {'synced': 0, 'skipped': 2, 'failed': 0}
@@ -0,0 +1,52 @@
+from ai.conversation import ConversationStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _exchange(conversation, i):
+    conversation.add_exchange(
+        {"role": "user", "content": f"q{i}"}, {"role": "assistant", "content": f"a{i}"})
+
+
+def test_conversations_are_separated_by_key():
+    store = ConversationStore(max_messages=4)
+    _exchange(store.get((1, 10)), 0)
+    assert list(store.get((2, 20)).messages) == []
+    assert len(store.get((1, 10)).messages) == 2
+
+
+def test_history_keeps_latest_pairs_within_limit():
+    store = ConversationStore(max_messages=4)
+    conversation = store.get((1, 10))
+    for i in range(5):
+        _exchange(conversation, i)
+    assert [m["content"] for m in conversation.messages] == ["q3", "a3", "q4", "a4"]
+
+
+def test_least_recently_used_conversation_is_evicted():
+    store = ConversationStore(max_messages=4, max_conversations=2)
+    store.get('a')
+    store.get('b')
+    store.get('a')
+    store.get('c')
+    assert 'a' in store
+    assert 'b' not in store
+    assert len(store) == 2
+
+
+def test_idle_conversations_are_evicted():
+    clock = FakeClock()
+    store = ConversationStore(max_messages=4, idle_timeout=60, clock=clock)
+    _exchange(store.get('old'), 0)
+    clock.now = 30
+    store.get('recent')
+    clock.now = 70
+    store.get('new')
+    assert 'old' not in store
+    assert 'recent' in store
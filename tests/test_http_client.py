@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from api import API
+from utils.http_client import HttpClient, HttpError
+
+
+class StubServer:
+    """テスト用のローカルHTTPサーバー。パスごとに応答を順番に返す"""
+
+    def __init__(self, routes: dict[str, list]):
+        self.routes = routes
+        self.requests: list[str] = []
+        self.runner = None
+        self.base_url = None
+
+    async def _handle(self, request):
+        self.requests.append(request.path)
+        responses = self.routes[request.path]
+        status, body, delay = responses.pop(0) if len(responses) > 1 else responses[0]
+        if delay:
+            await asyncio.sleep(delay)
+        return web.json_response(body, status=status)
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self._handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.base_url = f'http://127.0.0.1:{port}'
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+
+def _run(routes, scenario):
+    async def main():
+        async with StubServer(routes) as server:
+            client = HttpClient(timeout=0.5, retries=2, backoff=0.01)
+            try:
+                return await scenario(server, client), server.requests
+            finally:
+                await client.close()
+    return asyncio.run(main())
+
+
+def test_get_json_returns_decoded_body():
+    result, requests = _run(
+        {'/ok': [(200, {'message': 'hi'}, 0)]},
+        lambda server, client: client.get_json(f'{server.base_url}/ok'))
+    assert result == {'message': 'hi'}
+    assert requests == ['/ok']
+
+
+def test_get_json_retries_server_errors():
+    result, requests = _run(
+        {'/flaky': [(503, {}, 0), (500, {}, 0), (200, {'message': 'ok'}, 0)]},
+        lambda server, client: client.get_json(f'{server.base_url}/flaky'))
+    assert result == {'message': 'ok'}
+    assert len(requests) == 3
+
+
+def test_get_json_does_not_retry_client_errors():
+    async def scenario(server, client):
+        with pytest.raises(HttpError) as excinfo:
+            await client.get_json(f'{server.base_url}/missing')
+        return excinfo.value.status
+
+    status, requests = _run({'/missing': [(404, {}, 0)]}, scenario)
+    assert status == 404
+    assert len(requests) == 1
+
+
+def test_get_json_gives_up_after_timeouts():
+    async def scenario(server, client):
+        with pytest.raises(HttpError):
+            await client.get_json(f'{server.base_url}/slow')
+
+    _, requests = _run({'/slow': [(200, {}, 1.0)]}, scenario)
+    assert len(requests) == 3
+
+
+def test_session_is_reused_across_requests():
+    async def scenario(server, client):
+        await client.get_json(f'{server.base_url}/ok')
+        session = client._get_session()
+        await client.get_json(f'{server.base_url}/ok')
+        return client._get_session() is session
+
+    reused, _ = _run({'/ok': [(200, {}, 0)]}, scenario)
+    assert reused
+
+
+def test_api_get_info_returns_none_on_failure():
+    async def scenario(server, client):
+        api = API(client)
+        return await api.getInfo(f'{server.base_url}/missing')
+
+    result, _ = _run({'/missing': [(404, {}, 0)]}, scenario)
+    assert result is None
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.image_search import ImagePager, ImageSearch
+
+
+def _results(count: int) -> list[dict]:
+    return [{"title": f"dog {i}", "image": f"https://example.com/{i}.png", "source": "example"}
+            for i in range(count)]
+
+
+class _Search:
+    """DDGSの代わりに呼び出し回数を記録する検索関数"""
+
+    def __init__(self, results: list[dict], delay: float = 0.0):
+        self.results = results
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, query: str, max_results: int) -> list[dict]:
+        self.calls.append((query, max_results))
+        time.sleep(self.delay)
+        return self.results[:max_results]
+
+
+def test_repeat_query_is_served_from_cache():
+    search = _Search(_results(30))
+    images = ImageSearch(page_size=20, search=search)
+
+    async def scenario():
+        fetched = await images.fetch('Shiba  Inu')
+        # 全角・大文字小文字・空白の違いは同じクエリとして扱う
+        return fetched, images.cached('ｓｈｉｂａ inu')
+
+    fetched, cached = asyncio.run(scenario())
+
+    assert len(fetched) == 20
+    assert cached == fetched
+    assert search.calls == [('Shiba  Inu', 20)]
+
+
+def test_empty_results_are_not_cached():
+    search = _Search([])
+    images = ImageSearch(search=search)
+
+    assert asyncio.run(images.fetch('nothing')) == []
+    assert images.cached('nothing') is None
+
+
+def test_slow_search_raises_timeout():
+    images = ImageSearch(timeout=0.05, search=_Search(_results(1), delay=0.3))
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(images.fetch('slow'))
+    assert images.cached('slow') is None
+
+
+class _Response:
+    def __init__(self):
+        self.footers = []
+
+    async def edit_message(self, *, embed, view):
+        self.footers.append(embed.footer.text)
+
+
+class _Interaction:
+    def __init__(self):
+        self.response = _Response()
+
+
+def test_pager_wraps_around():
+    async def scenario():
+        pager = ImagePager('dog', _results(3))
+        interaction = _Interaction()
+        await pager.prev.callback(interaction)
+        await pager.next.callback(interaction)
+        await pager.next.callback(interaction)
+        await pager.next.callback(interaction)
+        return [footer.rsplit(' | ', 1)[1] for footer in interaction.response.footers]
+
+    assert asyncio.run(scenario()) == ['3/3', '1/3', '2/3', '3/3']
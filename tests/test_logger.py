@@ -0,0 +1,61 @@
+import io
+import json
+import logging
+import sys
+
+from utils import logger as logger_module
+from utils.logger import setup_logger
+
+
+def test_loggers_share_one_queue_handler():
+    first = setup_logger('tests.logger.first')
+    second = setup_logger('tests.logger.second')
+
+    assert first.handlers == second.handlers == [logger_module._queue_handler]
+    assert logger_module._listener is not None
+
+
+def test_json_output_through_queue_keeps_exception(tmp_path, monkeypatch):
+    stream = io.StringIO()
+    monkeypatch.setenv('LOG_JSON', 'true')
+    monkeypatch.setenv('LOG_TO_FILE', 'true')
+    monkeypatch.setattr(logger_module, 'LOG_FILE', tmp_path / 'bot.log')
+    monkeypatch.setattr(logger_module.sys, 'stdout', stream)
+    # 共有のハンドラーとリスナーをこのテスト用に作り直す（終了後に元へ戻す）
+    monkeypatch.setattr(logger_module, '_queue_handler', None)
+    monkeypatch.setattr(logger_module, '_listener', None)
+
+    logger = setup_logger('tests.logger.json')
+    logger.propagate = False
+    try:
+        logger.info('川柳 %s', '古池や')
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            logger.exception('failed')
+    finally:
+        logger_module.shutdown_logging()
+        logger.handlers.clear()
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(e['level'], e['logger'], e['message']) for e in entries] == [
+        ('INFO', 'tests.logger.json', '川柳 古池や'),
+        ('ERROR', 'tests.logger.json', 'failed'),
+    ]
+    assert 'ValueError: boom' in entries[1]['exception']
+    file_entries = [json.loads(line) for line in (tmp_path / 'bot.log').read_text(encoding='utf-8').splitlines()]
+    assert file_entries == entries
+
+
+def test_text_output_through_queue_keeps_traceback():
+    handler = logger_module._RecordQueueHandler(None)
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        record = logging.LogRecord('t', logging.ERROR, __file__, 1, 'failed %s', ('x',), sys.exc_info())
+    prepared = handler.prepare(record)
+
+    assert (prepared.msg, prepared.args, prepared.exc_info) == ('failed x', None, None)
+    text = logging.Formatter('%(message)s').format(prepared)
+    assert text.startswith('failed x\nTraceback') and text.endswith('ValueError: boom')
+    assert isinstance(logger_module._get_queue_handler(), logger_module._RecordQueueHandler)
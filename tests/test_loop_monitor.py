@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+from utils.loop_monitor import LoopMonitor, blocking_call_site
+
+
+def _blocking_helper():
+    time.sleep(0.3)
+
+
+async def _handler():
+    _blocking_helper()
+
+
+def test_detects_blocking_call_site():
+    async def scenario():
+        monitor = LoopMonitor(interval_ms=10, threshold_ms=100)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        # discord.pyのイベントと同じく、ハンドラーを独立したタスクとして実行する
+        await asyncio.create_task(_handler())
+        await asyncio.sleep(0.05)
+        await monitor.close()
+        return monitor
+
+    monitor = asyncio.run(scenario())
+    assert monitor.max_lag >= 0.2
+    [((handler, site), count)] = monitor.blocking_sites()
+    assert handler == '_handler'
+    assert site.startswith('tests/test_loop_monitor.py:') and site.endswith('_blocking_helper')
+    assert count == 1
+
+
+def test_idle_loop_is_not_reported():
+    async def scenario():
+        monitor = LoopMonitor(interval_ms=10, threshold_ms=100)
+        monitor.start()
+        await asyncio.sleep(0.3)
+        await monitor.close()
+        return monitor
+
+    monitor = asyncio.run(scenario())
+    assert monitor.blocking_sites() == []
+    assert monitor.max_lag < 0.1
+
+
+def test_call_site_outside_project_falls_back_to_innermost_frame():
+    import traceback
+
+    stack = traceback.StackSummary.from_list([('/usr/lib/python3/asyncio/events.py', 80, '_run', None)])
+    assert blocking_call_site(stack) == ('unknown', '/usr/lib/python3/asyncio/events.py:80 _run')
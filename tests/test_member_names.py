@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import discord
+
+from utils.member_names import MemberNameCache
+
+
+class _Member:
+    def __init__(self, guild, user_id: int, name: str):
+        self.guild = guild
+        self.id = user_id
+        self.display_name = name
+
+
+class _Guild:
+    """メンバー一覧をキャッシュしていないサーバー。query_membersの呼び出しを記録する"""
+
+    def __init__(self, names: dict[int, str], cached: dict[int, str] | None = None, error=None, delays=None):
+        self.id = 1
+        self.names = names
+        self.cached = cached or {}
+        self.error = error
+        # 何回目の要求を何秒遅らせるか
+        self.delays = delays or {}
+        self.queries = []
+
+    def get_member(self, user_id):
+        name = self.cached.get(user_id)
+        return _Member(self, user_id, name) if name else None
+
+    async def query_members(self, *, user_ids, limit, cache):
+        self.queries.append(list(user_ids))
+        await asyncio.sleep(self.delays.get(len(self.queries) - 1, 0))
+        if self.error is not None:
+            raise self.error
+        return [_Member(self, i, self.names[i]) for i in user_ids if i in self.names][:limit]
+
+
+def test_missing_members_are_fetched_in_one_request_and_cached():
+    guild = _Guild({10: "alice", 11: "bob"}, cached={12: "carol"})
+    cache = MemberNameCache()
+
+    first = asyncio.run(cache.display_names(guild, [10, 11, 10, 12, 13]))
+    # サーバーにいないユーザー（13）も問い合わせ直さない
+    second = asyncio.run(cache.display_names(guild, [10, 11, 12, 13]))
+
+    assert first == {10: "alice", 11: "bob", 12: "carol", 13: "<@13>"}
+    assert second == first
+    # 重複を除き、キャッシュにない分だけを1回で取得する
+    assert guild.queries == [[10, 11, 13]]
+
+
+def test_remembered_members_skip_the_request():
+    guild = _Guild({})
+    cache = MemberNameCache()
+    cache.remember(_Member(guild, 10, "alice"))
+
+    assert asyncio.run(cache.display_name(guild, 10)) == "alice"
+    assert guild.queries == []
+
+
+def test_cache_is_bounded_and_expires():
+    guild = _Guild({i: f"user{i}" for i in range(10)})
+    cache = MemberNameCache(maxsize=3, ttl=0)
+
+    asyncio.run(cache.display_names(guild, range(10)))
+    asyncio.run(cache.display_names(guild, [0]))
+
+    assert len(cache) <= 3
+    assert guild.queries == [list(range(10)), [0]]
+
+
+def test_lookup_failure_falls_back_to_mentions():
+    guild = _Guild({10: "alice"}, error=asyncio.TimeoutError())
+    cache = MemberNameCache()
+
+    assert asyncio.run(cache.display_names(guild, [10])) == {10: "<@10>"}
+
+    guild.error = discord.ClientException("not connected")
+    assert asyncio.run(cache.display_name(guild, 10)) == "<@10>"
+
+
+def test_chunks_are_queried_together_under_one_deadline():
+    guild = _Guild({i: f"user{i}" for i in range(250)}, delays={1: 10})
+    cache = MemberNameCache(timeout=0.2)
+
+    async def scenario():
+        started = time.perf_counter()
+        names = await cache.display_names(guild, range(250))
+        return names, time.perf_counter() - started
+
+    names, elapsed = asyncio.run(scenario())
+
+    # 100人ずつの3回の要求を同時に送り、応答のない2回目を待ち続けない
+    assert [len(ids) for ids in guild.queries] == [100, 100, 50]
+    assert elapsed < 1
+    assert names[0] == "user0" and names[249] == "user249"
+    assert names[150] == "<@150>"
+    # タイムアウトした分はキャッシュせず、次の一覧で取得し直す
+    guild.delays = {}
+    assert asyncio.run(cache.display_name(guild, 150)) == "user150"
@@ -0,0 +1,83 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from utils.metrics import MetricsServer, Registry
+
+
+def test_render_counters_and_histograms():
+    registry = Registry()
+    requests = registry.counter('ai_requests_total', 'AI APIの呼び出し回数', ['provider', 'status'])
+    latency = registry.histogram('ai_request_seconds', 'AI APIの応答時間', ['provider'], buckets=(0.1, 1.0))
+
+    requests.inc(provider='grok', status='ok')
+    requests.inc(provider='grok', status='ok')
+    requests.inc(provider='grok', status='error')
+    latency.observe(0.05, provider='grok')
+    latency.observe(0.5, provider='grok')
+    latency.observe(3, provider='grok')
+
+    lines = registry.render().splitlines()
+    assert '# TYPE ai_requests_total counter' in lines
+    assert 'ai_requests_total{provider="grok",status="ok"} 2' in lines
+    assert 'ai_requests_total{provider="grok",status="error"} 1' in lines
+    assert '# TYPE ai_request_seconds histogram' in lines
+    # バケットは累積件数
+    assert 'ai_request_seconds_bucket{provider="grok",le="0.1"} 1' in lines
+    assert 'ai_request_seconds_bucket{provider="grok",le="1"} 2' in lines
+    assert 'ai_request_seconds_bucket{provider="grok",le="+Inf"} 3' in lines
+    assert 'ai_request_seconds_sum{provider="grok"} 3.55' in lines
+    assert 'ai_request_seconds_count{provider="grok"} 3' in lines
+
+
+def test_labels_are_escaped_and_validated():
+    registry = Registry()
+    commands = registry.counter('discord_commands_total', 'コマンド数', ['command'])
+    commands.inc(command='say "hi"\n')
+
+    assert 'discord_commands_total{command="say \\"hi\\"\\n"} 1' in registry.render()
+    with pytest.raises(ValueError):
+        commands.inc(cmd='talk')
+    # 同じ名前・ラベルで登録し直すと既存のメトリクスが返る
+    assert registry.counter('discord_commands_total', 'コマンド数', ['command']) is commands
+    with pytest.raises(ValueError):
+        registry.histogram('discord_commands_total', 'コマンド数', ['command'])
+
+
+def test_histogram_time_records_even_on_error():
+    registry = Registry()
+    latency = registry.histogram('sqlite_query_seconds', 'SQLite', ['op'])
+
+    with pytest.raises(RuntimeError):
+        with latency.time(op='read'):
+            raise RuntimeError
+    assert latency.count(op='read') == 1
+
+
+def test_metrics_server_serves_prometheus_text():
+    registry = Registry()
+    registry.counter('reminder_deliveries_total', '配信数', ['status']).inc(status='ok')
+
+    async def scenario():
+        server = MetricsServer(registry, host='127.0.0.1', port=0)
+        await server.start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f'http://127.0.0.1:{server.port}/metrics') as response:
+                    return response.status, response.headers['Content-Type'], await response.text()
+        finally:
+            await server.close()
+
+    status, content_type, body = asyncio.run(scenario())
+    assert status == 200
+    assert content_type.startswith('text/plain; version=0.0.4')
+    assert 'reminder_deliveries_total{status="ok"} 1' in body
+
+
+def test_metrics_server_is_disabled_without_port(monkeypatch):
+    monkeypatch.delenv('METRICS_PORT', raising=False)
+    server = MetricsServer(Registry())
+
+    asyncio.run(server.start())
+    assert not server.enabled
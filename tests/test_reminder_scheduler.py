@@ -0,0 +1,174 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from reminder import ReminderScheduler, ReminderStore
+
+
+def _run(tmp_path, scenario, deliver=None, **options):
+    async def main():
+        store = ReminderStore(tmp_path / 'reminders.db')
+        await store.init()
+        delivered = []
+
+        async def record(reminder):
+            delivered.append(reminder.message)
+
+        scheduler = ReminderScheduler(store, deliver or record, **options)
+        try:
+            await scenario(store, scheduler)
+        finally:
+            await scheduler.close()
+        pending = await store.list_pending()
+        await store.close()
+        return delivered, pending
+
+    return asyncio.run(main())
+
+
+async def _add(store, message, seconds, channel_id=10):
+    remind_at = datetime.now(timezone.utc) + timedelta(seconds=seconds)
+    reminder_id = await store.add(
+        guild_id=1, channel_id=channel_id, user_id=100, message=message, remind_at=remind_at)
+    return await store.get(reminder_id)
+
+
+def test_loads_pending_reminders_and_delivers_in_order(tmp_path):
+    async def scenario(store, scheduler):
+        await _add(store, 'second', 0.1)
+        await _add(store, 'first', 0.05)
+        await scheduler.start()
+        await asyncio.sleep(0.3)
+
+    delivered, pending = _run(tmp_path, scenario)
+    assert delivered == ['first', 'second']
+    assert pending == []
+
+
+def test_earlier_reminder_wakes_scheduler(tmp_path):
+    async def scenario(store, scheduler):
+        await _add(store, 'later', 3600)
+        await scheduler.start()
+        await asyncio.sleep(0.01)
+        scheduler.schedule(await _add(store, 'soon', 0.05))
+        await asyncio.sleep(0.2)
+
+    delivered, pending = _run(tmp_path, scenario)
+    assert delivered == ['soon']
+    assert [r.message for r in pending] == ['later']
+
+
+def test_cancelled_reminder_is_not_delivered(tmp_path):
+    async def scenario(store, scheduler):
+        await scheduler.start()
+        reminder = await _add(store, 'cancelled', 0.05)
+        scheduler.schedule(reminder)
+        await store.delete(reminder.id)
+        scheduler.cancel(reminder.id)
+        await asyncio.sleep(0.15)
+        assert scheduler.next_due() is None
+
+    delivered, _ = _run(tmp_path, scenario)
+    assert delivered == []
+
+
+def test_overdue_backlog_is_delivered_concurrently_per_channel(tmp_path):
+    active = {10: 0, 20: 0}
+    peak = {10: 0, 20: 0}
+    delivered = []
+
+    async def deliver(reminder):
+        active[reminder.channel_id] += 1
+        peak[reminder.channel_id] = max(peak[reminder.channel_id], active[reminder.channel_id])
+        await asyncio.sleep(0.01)
+        active[reminder.channel_id] -= 1
+        delivered.append(reminder.message)
+
+    async def scenario(store, scheduler):
+        for i in range(20):
+            await _add(store, f'overdue {i}', -60, channel_id=10 if i % 2 else 20)
+        await scheduler.start()
+        await asyncio.sleep(0.05)
+        await scheduler.wait_idle()
+
+    _, pending = _run(tmp_path, scenario, deliver=deliver, channel_concurrency=2)
+    assert len(delivered) == 20
+    assert peak == {10: 2, 20: 2}
+    assert pending == []
+
+
+def test_failed_delivery_is_retried_with_backoff(tmp_path):
+    attempts = []
+
+    async def deliver(reminder):
+        attempts.append(reminder.attempts)
+        if len(attempts) == 1:
+            raise RuntimeError('discord is down')
+
+    async def scenario(store, scheduler):
+        await _add(store, 'retry me', -1)
+        await scheduler.start()
+        await asyncio.sleep(0.02)
+        await scheduler.wait_idle()
+        # 1回目の失敗後は再試行を待っている
+        retrying = await store.list_pending()
+        assert [(r.attempts, r.due_at > r.remind_at) for r in retrying] == [(1, True)]
+        await asyncio.sleep(0.1)
+        await scheduler.wait_idle()
+
+    _, pending = _run(tmp_path, scenario, deliver=deliver, retry_backoff=0.05)
+    assert attempts == [0, 1]
+    assert pending == []
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    attempts = []
+
+    async def deliver(reminder):
+        attempts.append(reminder.attempts)
+        raise RuntimeError('forbidden')
+
+    async def scenario(store, scheduler):
+        await _add(store, 'never delivered', -1)
+        await scheduler.start()
+        await asyncio.sleep(0.1)
+        await scheduler.wait_idle()
+
+    _, pending = _run(tmp_path, scenario, deliver=deliver, retry_backoff=0.01, max_attempts=3)
+    assert attempts == [0, 1, 2]
+    assert pending == []
+
+
+def test_reminders_left_sending_are_redelivered_on_start(tmp_path):
+    async def scenario(store, scheduler):
+        await _add(store, 'interrupted', -1)
+        # 送信中にBotが落ちた状態を作る
+        assert [r.message for r in await store.claim_due(datetime.now(timezone.utc))] == ['interrupted']
+        assert await store.claim_due(datetime.now(timezone.utc)) == []
+        await scheduler.start()
+        await asyncio.sleep(0.02)
+        await scheduler.wait_idle()
+
+    delivered, pending = _run(tmp_path, scenario)
+    assert delivered == ['interrupted']
+    assert pending == []
+
+
+def test_claim_due_uses_delivery_state_index(tmp_path):
+    async def main():
+        store = ReminderStore(tmp_path / 'reminders.db')
+        await store.init()
+        async with store.db.read() as db:
+            cursor = await db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'reminders'")
+            indexes = {row[0] for row in await cursor.fetchall()}
+            cursor = await db.execute(
+                "EXPLAIN QUERY PLAN UPDATE reminders SET status = 'sending' "
+                "WHERE status = 'pending' AND next_attempt_at <= ? RETURNING *", (0,))
+            plan = await cursor.fetchall()
+        await store.close()
+        return indexes, plan
+
+    indexes, plan = asyncio.run(main())
+    # remind_at単独の索引は使われないため持たない
+    assert 'idx_reminders_remind_at' not in indexes
+    assert 'idx_reminders_status_next_attempt_at' in plan[0][-1]
@@ -0,0 +1,68 @@
+import asyncio
+
+from ai.search_cache import SearchCache, normalize_query
+from utils.ttl_cache import TTLCache
+
+RESULT = {"content": "晴れです", "citations": ["https://example.com"]}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expires_items():
+    clock = FakeClock()
+    cache = TTLCache(ttl=10, clock=clock)
+    cache.set('a', 1)
+    clock.now = 9
+    assert cache.get('a') == 1
+    clock.now = 10
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert 'a' in cache
+    assert 'b' not in cache
+
+
+def test_normalize_query_ignores_width_case_and_spaces():
+    assert normalize_query('  Ｐｙｔｈｏｎ　最新情報 ') == normalize_query('python 最新情報')
+
+
+def test_search_cache_survives_restart(tmp_path):
+    async def scenario():
+        cache = SearchCache(tmp_path / 'search_cache.db', ttl=60)
+        await cache.init()
+        assert await cache.get('今日の天気') is None
+        await cache.set('今日の天気', RESULT)
+        await cache.close()
+
+        restarted = SearchCache(tmp_path / 'search_cache.db', ttl=60)
+        await restarted.init()
+        result = await restarted.get(' 今日の天気 ')
+        await restarted.close()
+        return result, restarted.hit_rate, cache.hit_rate
+
+    assert asyncio.run(scenario()) == (RESULT, 1.0, 0.0)
+
+
+def test_search_cache_ignores_expired_results(tmp_path):
+    async def scenario():
+        cache = SearchCache(tmp_path / 'search_cache.db', ttl=0)
+        await cache.init()
+        await cache.set('今日の天気', RESULT)
+        result = await cache.get('今日の天気')
+        await cache.close()
+        return result
+
+    assert asyncio.run(scenario()) is None
@@ -1,6 +1,14 @@
-from senryu import is_senryu, split_575
+import asyncio
+import random
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from senryu import SenryuDetector, is_senryu, split_575, split_575_many
+from senryu import counter
 from senryu.counter import count_mora
 
+CORPUS_PATH = Path(__file__).resolve().parent / 'data' / 'senryu_corpus.txt'
+
 
 def test_count_mora_basic():
     assert count_mora('フルイケヤ') == 5
@@ -59,3 +67,128 @@ def test_split_575_none_when_no_sentence_matches():
 def test_is_senryu_matches_split_575():
     assert is_senryu('古池や蛙飛び込む水の音') is True
     assert is_senryu('こんにちは') is False
+
+
+def test_detector_returns_same_result_as_split_575():
+    detector = SenryuDetector()
+    try:
+        for text in ['古池や蛙飛び込む水の音', 'こんにちは', '']:
+            assert asyncio.run(detector.detect(text)) == split_575(text)
+    finally:
+        detector.close()
+
+
+def test_detector_drops_when_queue_is_full():
+    detector = SenryuDetector(max_pending=0)
+    try:
+        assert asyncio.run(detector.detect('古池や蛙飛び込む水の音')) is None
+        assert detector.dropped == 1
+        assert detector.queue_depth == 0
+    finally:
+        detector.close()
+
+
+def test_split_575_tokenizes_each_sentence_once_per_message():
+    counter._tokenize.cache_clear()
+    text = '猫が好き。犬も好き。鳥も好き。猫が好き'
+    assert split_575(text) is None
+    # 異なる3文だけが解析され、重複する文や窓の重なりはトークン表から引かれる
+    assert counter.token_cache_info().misses == 3
+    assert counter.token_cache_info().hits == 0
+
+
+def test_split_575_reuses_token_cache_across_messages():
+    counter._tokenize.cache_clear()
+    split_575('古池や蛙飛び込む水の音')
+    split_575('古池や蛙飛び込む水の音')
+    info = counter.token_cache_info()
+    assert info.misses == 1
+    assert info.hits == 1
+
+
+def _load_corpus():
+    lines = CORPUS_PATH.read_text(encoding='utf-8').splitlines()
+    return [line.replace('\\n', '\n') for line in lines if line and not line.startswith('#')]
+
+
+def _split_575_without_prefilter(text):
+    """モーラ数の見積もりによる足切りを行わない、従来どおりの判定"""
+    cleaned = counter._clean(text)
+    if not cleaned:
+        return None
+    sentences = counter._sentences(cleaned)
+    table = {}
+    for i in range(len(sentences) - 2):
+        matched = counter._match_three_sentences(sentences[i:i + 3], table)
+        if matched is not None:
+            return matched
+    for sentence in sentences:
+        result = counter._split_sentence(sentence, counter._tokens_for(table, sentence))
+        if result is not None:
+            return result
+    return None
+
+
+def _corpus_messages():
+    corpus = _load_corpus()
+    rng = random.Random(575)
+    # 単体のメッセージに加え、コーパスの文を組み合わせた複数行メッセージも検証する
+    combined = ['\n'.join(rng.sample(corpus, 3)) for _ in range(300)]
+    return corpus + combined
+
+
+def test_mora_bounds_contain_actual_mora_for_corpus():
+    for message in _corpus_messages():
+        for sentence in counter._sentences(counter._clean(message)):
+            tokens = counter._tokenize(sentence)
+            bounds = counter._mora_bounds(sentence)
+            if bounds is None:
+                assert tokens is None, sentence
+            elif tokens is not None:
+                lower, upper = bounds
+                assert lower <= sum(m for _, m in tokens) <= upper, sentence
+
+
+def test_prefilter_has_no_false_negatives_for_corpus():
+    messages = _corpus_messages()
+    detected = 0
+    for message in messages:
+        expected = _split_575_without_prefilter(message)
+        assert split_575(message) == expected, message
+        detected += expected is not None
+    # コーパスに川柳が十分含まれていること自体も確認しておく
+    assert detected >= 10
+
+
+def test_mora_bounds_reject_ascii_and_emoji():
+    assert counter._mora_bounds('www') is None
+    assert counter._mora_bounds('🎉🎉🎉') is None
+    assert counter._mora_bounds('古池や 蛙飛び込む') is None
+    assert counter._mora_bounds('おはよう') == (2, 4)
+
+
+def test_detector_queues_messages_behind_warm_up():
+    detector = SenryuDetector()
+    try:
+        detector.warm_up()
+        assert asyncio.run(detector.detect('古池や蛙飛び込む水の音')) == ['古池や', '蛙飛び込む', '水の音']
+        assert counter.is_ready()
+    finally:
+        detector.close()
+
+
+def test_split_575_many_keeps_input_order_with_executor():
+    texts = ['こんにちは', '古池や蛙飛び込む水の音', '', '閑さや岩にしみ入る蝉の声'] * 30
+    expected = [split_575(text) for text in texts]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert split_575_many(texts, executor=executor, chunk_size=7) == expected
+    assert split_575_many(iter(texts)) == expected
+
+
+def test_detector_detect_many_matches_split_575():
+    texts = ['古池や蛙飛び込む水の音', 'こんにちは']
+    detector = SenryuDetector()
+    try:
+        assert asyncio.run(detector.detect_many(texts)) == [split_575(text) for text in texts]
+    finally:
+        detector.close()
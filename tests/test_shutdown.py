@@ -0,0 +1,40 @@
+import asyncio
+import os
+import signal
+import sqlite3
+
+from senryu import SenryuStore
+from utils.shutdown import install_shutdown_handler
+
+LINES = ['古池や', '蛙飛び込む', '水の音']
+
+
+def test_sigterm_flushes_write_behind_rows(tmp_path):
+    db_path = tmp_path / 'senryu.db'
+
+    async def scenario():
+        store = SenryuStore(db_path, write_behind=True, flush_rows=100, flush_interval_ms=60_000)
+        await store.init()
+        closed = asyncio.Event()
+
+        async def close():
+            await store.close()
+            closed.set()
+
+        install_shutdown_handler(close)
+        try:
+            for message_id in range(1000, 1003):
+                await store.add(guild_id=1, channel_id=10, user_id=100, message_id=message_id, lines=LINES)
+            queued = store.pending
+            os.kill(os.getpid(), signal.SIGTERM)
+            await asyncio.wait_for(closed.wait(), timeout=5)
+        finally:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGTERM)
+        return queued, store.pending
+
+    assert asyncio.run(scenario()) == (3, 0)
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM senryus").fetchone()[0] == 3
+    finally:
+        conn.close()
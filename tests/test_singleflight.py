@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return '結果'
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do('猫', fetch) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ['結果'] * 5
+    assert calls == 1
+    assert flight.coalesced == 4
+    assert len(flight) == 0
+
+
+def test_errors_propagate_to_all_waiters_and_are_not_cached():
+    flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        if calls == 1:
+            raise RuntimeError('upstream down')
+        return 'ok'
+
+    async def scenario():
+        results = await asyncio.gather(
+            *(flight.do('猫', fetch) for _ in range(3)), return_exceptions=True)
+        return results, await flight.do('猫', fetch)
+
+    results, retried = asyncio.run(scenario())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert retried == 'ok'
+    assert calls == 2
+
+
+def test_cancelled_waiter_does_not_cancel_shared_execution():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return 'ok'
+
+    async def scenario():
+        first = asyncio.ensure_future(flight.do('猫', fetch))
+        second = asyncio.ensure_future(flight.do('猫', fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == 'ok'
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from utils.sqlite import DatabaseManager
+
+
+def test_connection_is_shared_and_uses_wal(tmp_path):
+    async def scenario():
+        databases = DatabaseManager()
+        database = databases.get(tmp_path / 'test.db')
+        assert databases.get(tmp_path / '.' / 'test.db') is database
+
+        async with database.read() as db:
+            cursor = await db.execute("PRAGMA journal_mode")
+            journal_mode = (await cursor.fetchone())[0]
+        async with database.read() as db:
+            cursor = await db.execute("PRAGMA synchronous")
+            synchronous = (await cursor.fetchone())[0]
+        async with database.read() as first:
+            pass
+        async with database.read() as second:
+            pass
+        await databases.close_all()
+        return journal_mode, synchronous, first is second
+
+    # synchronous=NORMALは1
+    assert asyncio.run(scenario()) == ('wal', 1, True)
+
+
+def test_transaction_rolls_back_on_error(tmp_path):
+    async def scenario():
+        databases = DatabaseManager()
+        database = databases.get(tmp_path / 'test.db')
+        async with database.transaction() as db:
+            await db.execute("CREATE TABLE items (name TEXT)")
+            await db.execute("INSERT INTO items VALUES ('kept')")
+
+        with pytest.raises(RuntimeError):
+            async with database.transaction() as db:
+                await db.execute("INSERT INTO items VALUES ('discarded')")
+                raise RuntimeError
+
+        async with database.read() as db:
+            cursor = await db.execute("SELECT name FROM items")
+            rows = [row["name"] for row in await cursor.fetchall()]
+        await databases.close_all()
+        return rows
+
+    assert asyncio.run(scenario()) == ['kept']
+
+
+def test_concurrent_transactions_do_not_interleave(tmp_path):
+    async def scenario():
+        databases = DatabaseManager()
+        database = databases.get(tmp_path / 'test.db')
+        async with database.transaction() as db:
+            await db.execute("CREATE TABLE items (n INTEGER)")
+
+        async def insert_then_fail():
+            async with database.transaction() as db:
+                await db.execute("INSERT INTO items VALUES (1)")
+                await asyncio.sleep(0.01)
+                raise RuntimeError
+
+        async def insert():
+            async with database.transaction() as db:
+                await db.execute("INSERT INTO items VALUES (2)")
+
+        results = await asyncio.gather(insert_then_fail(), insert(), return_exceptions=True)
+        async with database.read() as db:
+            cursor = await db.execute("SELECT n FROM items")
+            rows = [row[0] for row in await cursor.fetchall()]
+        await databases.close_all()
+        return isinstance(results[0], RuntimeError), rows
+
+    # 失敗したトランザクションのロールバックに、並行する書き込みが巻き込まれない
+    assert asyncio.run(scenario()) == (True, [2])
+
+
+def test_migrate_applies_only_pending_migrations(tmp_path):
+    applied = []
+
+    async def create(db):
+        applied.append(1)
+        await db.execute("CREATE TABLE items (name TEXT)")
+
+    async def add_column(db):
+        applied.append(2)
+        await db.execute("ALTER TABLE items ADD COLUMN note TEXT")
+
+    async def broken(db):
+        await db.execute("CREATE TABLE other (n INTEGER)")
+        raise RuntimeError
+
+    async def scenario():
+        databases = DatabaseManager()
+        database = databases.get(tmp_path / 'test.db')
+        first = await database.migrate([create])
+        second = await database.migrate([create, add_column])
+        with pytest.raises(RuntimeError):
+            await database.migrate([create, add_column, broken])
+        async with database.read() as db:
+            cursor = await db.execute("PRAGMA user_version")
+            version = (await cursor.fetchone())[0]
+            cursor = await db.execute("SELECT name FROM sqlite_master WHERE name = 'other'")
+            leftover = await cursor.fetchone()
+        await databases.close_all()
+        return first, second, version, leftover
+
+    # 失敗したマイグレーションはDDLも含めてロールバックされ、版は進まない
+    assert asyncio.run(scenario()) == (1, 2, 2, None)
+    assert applied == [1, 2]
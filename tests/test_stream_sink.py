@@ -0,0 +1,114 @@
+import asyncio
+
+import discord
+import pytest
+
+from utils.stream_sink import DiscordStreamSink, paginate
+
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+        self.edits = 0
+
+    async def edit(self, content):
+        self.content = content
+        self.edits += 1
+
+
+class FakeChannel:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, content):
+        message = FakeMessage(content)
+        self.messages.append(message)
+        return message
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_paginate_splits_by_max_length():
+    assert paginate('abcdefg', 3) == ['abc', 'def', 'g']
+    assert paginate('', 3) == []
+
+
+def test_sink_edits_at_most_once_per_interval():
+    channel = FakeChannel()
+    clock = FakeClock()
+    sink = DiscordStreamSink(channel.send, header='> q\n\n', interval=1.0, clock=clock)
+
+    async def scenario():
+        await sink.write('こん')
+        clock.now = 0.3
+        await sink.write('にち')
+        clock.now = 1.2
+        await sink.write('は')
+        await sink.close()
+
+    asyncio.run(scenario())
+    assert [m.content for m in channel.messages] == ['> q\n\nこんにちは']
+    assert channel.messages[0].edits == 1
+    assert sink.first_visible_latency == 0.0
+
+
+def test_sink_rolls_over_into_continuation_messages():
+    channel = FakeChannel()
+    sink = DiscordStreamSink(channel.send, interval=0, max_length=5)
+
+    async def scenario():
+        for ch in 'abcdefghijkl':
+            await sink.write(ch)
+        await sink.close()
+
+    asyncio.run(scenario())
+    assert [m.content for m in channel.messages] == ['abcde', 'fghij', 'kl']
+
+
+def test_sink_flushes_on_timer_while_the_stream_stalls():
+    channel = FakeChannel()
+    sink = DiscordStreamSink(channel.send, interval=0.05)
+
+    async def scenario():
+        await sink.write('古池や')
+        await sink.write(' 蛙飛び込む')
+        # 次の差分が届かなくても、間隔が空いたら受け取り済みの分を反映する
+        await asyncio.sleep(0.2)
+        shown = channel.messages[0].content
+        await sink.close()
+        return shown
+
+    assert asyncio.run(scenario()) == '古池や 蛙飛び込む'
+    assert channel.messages[0].edits == 1
+
+
+class FailingMessage(FakeMessage):
+    async def edit(self, content):
+        raise discord.HTTPException(FakeResponse(), 'rate limited')
+
+
+class FakeResponse:
+    status = 429
+    reason = 'Too Many Requests'
+
+
+def test_timer_flush_error_is_raised_to_the_writer():
+    async def send(content):
+        return FailingMessage(content)
+
+    sink = DiscordStreamSink(send, interval=0.01)
+
+    async def scenario():
+        await sink.write('a')
+        await sink.write('b')
+        await asyncio.sleep(0.05)
+        with pytest.raises(discord.HTTPException):
+            await sink.write('c')
+
+    asyncio.run(scenario())
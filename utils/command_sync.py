@@ -0,0 +1,116 @@
+"""
+スラッシュコマンドの同期
+
+コマンドツリーの定義をハッシュ化してファイルに保存し、前回同期したときから変わっていなければ同期しません。
+on_readyは再接続のたびに呼ばれるため、毎回すべてのサーバーへ同期するとレート制限のかかるAPIを大量に呼んでしまいます。
+サーバーごとの同期が必要な場合は、同時実行数を絞って並行に行います。
+ハッシュはアプリケーションIDごとに保存するため、同じデータを別のBot（ステージング用など）で使っても同期を省略しません。
+"""
+import asyncio
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import discord
+from discord import app_commands
+
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+STATE_PATH = Path(__file__).resolve().parent.parent / "data" / "command_tree.json"
+
+GLOBAL_SCOPE = "global"
+
+
+def tree_hash(tree: app_commands.CommandTree, guild: discord.abc.Snowflake | None = None) -> str:
+    """guild（Noneならグローバル）に登録されるコマンド定義のハッシュを返す"""
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+        key=lambda command: (command.get("type", 1), command["name"]),
+    )
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class CommandSyncer:
+    """コマンド定義が変わったスコープ（グローバル・サーバー）だけを同期する"""
+
+    DEFAULT_CONCURRENCY = 4  # サーバーごとの同期を同時に実行する数
+
+    def __init__(
+        self,
+        tree: app_commands.CommandTree,
+        state_path: Path = STATE_PATH,
+        concurrency: int | None = None,
+    ):
+        """
+        Args:
+            state_path: 同期済みのハッシュを保存するファイル
+            concurrency: サーバーごとの同期を同時に実行する数
+        """
+        self.tree = tree
+        self.state_path = state_path
+        self.concurrency = int(
+            concurrency if concurrency is not None
+            else os.getenv('COMMAND_SYNC_CONCURRENCY', self.DEFAULT_CONCURRENCY))
+        self._lock = asyncio.Lock()
+
+    def _load_state(self) -> dict[str, str]:
+        try:
+            return json.loads(self.state_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state: dict[str, str]) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state, indent=2, sort_keys=True), encoding="utf-8")
+        tmp_path.replace(self.state_path)
+
+    async def sync(self, guilds: list[discord.abc.Snowflake], force: bool = False) -> dict[str, int]:
+        """
+        定義が前回の同期から変わったスコープだけを同期する。forceならすべて同期する。
+
+        Returns:
+            {"synced": 同期したスコープ数, "skipped": 変更がなく省略した数, "failed": 失敗した数}
+        """
+        async with self._lock:
+            state = self._load_state()
+            application_id = self.tree.client.application_id
+            scopes: list[tuple[str, discord.abc.Snowflake | None]] = [(GLOBAL_SCOPE, None)]
+            scopes += [(str(guild.id), guild) for guild in guilds]
+            scopes = [(f"{application_id}:{scope}", guild) for scope, guild in scopes]
+
+            pending = []
+            for key, guild in scopes:
+                digest = tree_hash(self.tree, guild)
+                if force or state.get(key) != digest:
+                    pending.append((key, guild, digest))
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def sync_scope(key: str, guild: discord.abc.Snowflake | None, digest: str) -> bool:
+                async with semaphore:
+                    try:
+                        await self.tree.sync(guild=guild)
+                    except discord.HTTPException as e:
+                        logger.error(f"[sync] コマンドの同期に失敗 scope={key}: {e}")
+                        return False
+                # 同期できたスコープは、途中で他が失敗しても記録しておく
+                state[key] = digest
+                return True
+
+            results = await asyncio.gather(*(sync_scope(*scope) for scope in pending))
+            if pending:
+                self._save_state(state)
+
+        summary = {
+            "synced": sum(results),
+            "skipped": len(scopes) - len(pending),
+            "failed": len(results) - sum(results),
+        }
+        logger.info(
+            f"[sync] synced={summary['synced']} skipped={summary['skipped']} failed={summary['failed']}")
+        return summary
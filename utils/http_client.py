@@ -0,0 +1,115 @@
+"""
+非同期HTTPクライアント
+
+REST APIを呼ぶコマンドで共有する、aiohttpの長寿命セッションのラッパーです。
+- コネクションプール（keep-alive）とDNSキャッシュで接続コストを抑える
+- タイムアウトを設定できる
+- 接続エラー・タイムアウト・429/5xxはジッター付きの指数バックオフで再試行する
+"""
+import asyncio
+import json
+import random
+from typing import Any
+
+import aiohttp
+
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HttpError(Exception):
+    """HTTPリクエストが（再試行を含めて）失敗した場合の例外"""
+
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+
+class HttpClient:
+    """接続を使い回す非同期HTTPクライアント"""
+
+    def __init__(
+        self,
+        timeout: float = 10.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+        pool_size: int = 20,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 30.0,
+    ):
+        """
+        Args:
+            timeout: 1回のリクエスト全体のタイムアウト（秒）
+            retries: 失敗時に再試行する回数
+            backoff: 再試行間隔の基準（秒）。試行ごとに倍になり、±50%のジッターを加える
+            pool_size: 同時に保持する接続数の上限
+            dns_cache_ttl: DNSの解決結果をキャッシュする秒数
+            keepalive_timeout: 使われていない接続を保持する秒数
+        """
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # ClientSessionはイベントループ上で作る必要があるため、初回のリクエスト時に作成する
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    def _retry_delay(self, attempt: int) -> float:
+        return self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    async def request(self, method: str, url: str, **kwargs) -> tuple[int, bytes]:
+        """
+        リクエストを送信し、(ステータスコード, 本文)を返す。
+
+        Raises:
+            HttpError: 再試行しても成功しなかった場合、または4xx（429を除く）が返った場合
+        """
+        session = self._get_session()
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self._retry_delay(attempt - 1))
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    body = await response.read()
+                    if response.status in _RETRY_STATUSES:
+                        last_error = HttpError(f"{method} {url} -> {response.status}", response.status)
+                        logger.warning(f"[HTTP] {last_error} (attempt {attempt + 1})")
+                        continue
+                    if response.status >= 400:
+                        raise HttpError(f"{method} {url} -> {response.status}", response.status)
+                    logger.debug(f"[HTTP] {method} {url} -> {response.status}")
+                    return response.status, body
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = HttpError(f"{method} {url} failed: {type(e).__name__}: {e}")
+                logger.warning(f"[HTTP] {last_error} (attempt {attempt + 1})")
+        raise last_error
+
+    async def get_json(self, url: str, **kwargs) -> Any:
+        """GETしてJSONをデコードした結果を返す"""
+        _, body = await self.request("GET", url, **kwargs)
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise HttpError(f"GET {url}: invalid JSON: {e}") from e
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
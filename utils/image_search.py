@@ -0,0 +1,100 @@
+"""
+/image の画像検索
+
+DDGSの画像検索は同期APIのため、ワーカースレッドで実行してタイムアウトを設けます。
+1回の検索で複数件を取得してキャッシュに保存し、ボタンでのページ送りや同じクエリの再検索には
+キャッシュ済みの結果を使います（再検索はしません）。
+"""
+import asyncio
+from typing import Callable
+
+import discord
+from ddgs import DDGS
+
+from ai.search_cache import normalize_query
+from utils.ttl_cache import TTLCache
+
+
+def _search_ddgs(query: str, max_results: int) -> list[dict]:
+    with DDGS() as ddgs:
+        return list(ddgs.images(query, max_results=max_results))
+
+
+class ImageSearch:
+    """画像検索の結果を正規化したクエリごとにキャッシュする"""
+
+    DEFAULT_PAGE_SIZE = 20  # 1回の検索で取得してページ送りに使う件数
+    DEFAULT_TIMEOUT = 15  # 秒
+    DEFAULT_CACHE_SIZE = 128
+    DEFAULT_TTL = 600  # 秒
+
+    def __init__(
+        self,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        cache: TTLCache | None = None,
+        search: Callable[[str, int], list[dict]] = _search_ddgs,
+    ):
+        """
+        Args:
+            page_size: 1回の検索で取得する件数
+            timeout: 検索を待つ時間（秒）。超えるとasyncio.TimeoutErrorを送出する
+            search: (クエリ, 件数) を受け取り結果を返す同期関数（既定: DDGS）
+        """
+        self.page_size = page_size
+        self.timeout = timeout
+        self.cache = cache if cache is not None else TTLCache(maxsize=self.DEFAULT_CACHE_SIZE, ttl=self.DEFAULT_TTL)
+        self._search = search
+
+    def cached(self, query: str) -> list[dict] | None:
+        """キャッシュ済みの結果を返す。なければNone"""
+        return self.cache.get(normalize_query(query))
+
+    async def fetch(self, query: str) -> list[dict]:
+        """検索をワーカースレッドで実行し、結果があればキャッシュに保存して返す"""
+        results = await asyncio.wait_for(
+            asyncio.to_thread(self._search, query, self.page_size), timeout=self.timeout)
+        if results:
+            self.cache.set(normalize_query(query), results)
+        return results
+
+
+class ImagePager(discord.ui.View):
+    """画像検索結果をボタンでページ送りするビュー。再検索はせずキャッシュ済みの結果をめくる"""
+
+    def __init__(self, query: str, results: list[dict]):
+        super().__init__(timeout=600)
+        self.query = query
+        self.results = results
+        self.index = 0
+        self.message = None
+
+    def embed(self) -> discord.Embed:
+        img = self.results[self.index]
+        embed = discord.Embed(title=img.get("title", self.query), color=0x5865F2)
+        embed.set_image(url=img["image"])
+        embed.set_footer(
+            text=f"検索: {self.query} | 出典: {img.get('source', '')} | {self.index + 1}/{len(self.results)}")
+        return embed
+
+    async def _show(self, interaction: discord.Interaction, step: int) -> None:
+        self.index = (self.index + step) % len(self.results)
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, -1)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, 1)
+
+    async def on_timeout(self) -> None:
+        if self.message is None:
+            return
+        for item in self.children:
+            item.disabled = True
+        try:
+            await self.message.edit(view=self)
+        except discord.HTTPException:
+            pass
@@ -4,11 +4,22 @@
 プロジェクト全体で統一されたログ設定を提供します。
 - コンソール出力 (stdout)
 - ファイル出力 (logs/ ディレクトリ, ローテーション付き)
+
+ログの書き出しはイベントループを止めないよう、専用スレッドで行います。
+各ロガーは共有のQueueHandlerでレコードをキューに積むだけで、
+QueueListenerのスレッドがコンソール・ファイルへの書き込みとローテーションを行います。
+環境変数 LOG_JSON=true で、1行1レコードのJSON形式で出力します。
 """
+import atexit
+import copy
+import json
 import logging
+import os
+import queue
 import sys
+from datetime import datetime, timezone
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 # ログファイルの設定
 LOG_DIR = Path(__file__).resolve().parent.parent / "logs"
@@ -20,10 +31,117 @@ BACKUP_COUNT = 3  # ローテーションで保持するファイル数
 LOG_FORMAT = '[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s'
 LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
 
+# すべてのロガーで共有するQueueHandlerと、書き出しを行うQueueListener
+_queue_handler: "_RecordQueueHandler | None" = None
+_listener: QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """1行1レコードのJSONに整形するフォーマッター"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # キュー経由のレコードは、例外をexc_textに整形済みの状態で受け取る
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _RecordQueueHandler(QueueHandler):
+    """
+    例外情報を残したままキューに積むQueueHandler
+
+    標準のprepare()はメッセージを整形する際にトレースバックをmsgへ連結してexc_infoを捨てるため、
+    JsonFormatterが例外を別のキーとして出力できない。ここでは引数だけをmsgに埋め込み、
+    トレースバックはexc_textに整形して残す（フレームへの参照はスレッドをまたいで持ち越さない）
+    """
+
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def build_handlers(log_file: Path | None = LOG_FILE, json_format: bool = False, stream=None) -> list[logging.Handler]:
+    """
+    実際に書き出しを行うハンドラー（コンソール・ファイル）を作る
+
+    Args:
+        log_file: ファイル出力先（Noneの場合はファイルに出力しない）
+        json_format: JSON形式で出力するか
+        stream: コンソール出力先（省略時はstdout）
+    """
+    if json_format:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(fmt=LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+
+    # コンソールハンドラー
+    console_handler = logging.StreamHandler(stream or sys.stdout)
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(formatter)
+    handlers = [console_handler]
 
-def _ensure_log_dir():
-    """ログディレクトリを作成"""
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    # ファイルハンドラー (ローテーション付き)
+    if log_file is not None:
+        try:
+            log_file.parent.mkdir(parents=True, exist_ok=True)
+            file_handler = RotatingFileHandler(
+                log_file,
+                maxBytes=MAX_LOG_SIZE,
+                backupCount=BACKUP_COUNT,
+                encoding='utf-8'
+            )
+            file_handler.setLevel(logging.DEBUG)
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+        except OSError as e:
+            # ファイル出力に失敗してもコンソール出力は継続
+            print(f"ログファイルの作成に失敗しました: {e}", file=sys.stderr)
+
+    return handlers
+
+
+def _get_queue_handler() -> _RecordQueueHandler:
+    """共有のQueueHandlerを返す。初回にハンドラーと書き出し用スレッドを用意する"""
+    global _queue_handler, _listener
+    if _queue_handler is None:
+        json_format = os.getenv('LOG_JSON', 'false').lower() == 'true'
+        # LOG_TO_FILE=false ならファイルには出力しない（テスト実行時など）
+        log_file = LOG_FILE if os.getenv('LOG_TO_FILE', 'true').lower() == 'true' else None
+        log_queue = queue.SimpleQueue()
+        _listener = QueueListener(
+            log_queue, *build_handlers(log_file, json_format), respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        _queue_handler = _RecordQueueHandler(log_queue)
+    return _queue_handler
+
+
+def shutdown_logging() -> None:
+    """キューに残ったログを書き出し、書き出し用スレッドを止める"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
 
 
 def setup_logger(name: str = None) -> logging.Logger:
@@ -43,31 +161,7 @@ def setup_logger(name: str = None) -> logging.Logger:
         return logger
 
     logger.setLevel(logging.INFO)
-
-    formatter = logging.Formatter(fmt=LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
-
-    # コンソールハンドラー
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-
-    # ファイルハンドラー (ローテーション付き)
-    try:
-        _ensure_log_dir()
-        file_handler = RotatingFileHandler(
-            LOG_FILE,
-            maxBytes=MAX_LOG_SIZE,
-            backupCount=BACKUP_COUNT,
-            encoding='utf-8'
-        )
-        file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-    except OSError as e:
-        # ファイル出力に失敗してもコンソール出力は継続
-        logger.warning(f"ログファイルの作成に失敗しました: {e}")
-
+    logger.addHandler(_get_queue_handler())
     return logger
 
 
@@ -0,0 +1,174 @@
+"""
+イベントループの遅延の監視
+
+一定間隔で眠るタスクを動かし、予定より起きるのが遅れた時間（スケジューリングの遅延）を計測します。
+ループが同期処理でふさがれていると、このタスクも動けません。そこで別スレッドから監視し、
+一定時間以上ループが進んでいなければメインスレッドのスタックを取得して、
+どのハンドラーのどの関数がループを止めていたかを記録します。呼び出し箇所ごとの回数も集計します。
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from functools import partial
+from pathlib import Path
+
+from utils import metrics
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+_THIS_FILE = os.path.abspath(__file__)
+
+_LAG_SECONDS = metrics.histogram(
+    "event_loop_lag_seconds", "イベントループのスケジューリングの遅延",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+_BLOCKED = metrics.counter(
+    "event_loop_blocked_total", "イベントループを止めていた呼び出し箇所ごとの回数", ["handler", "site"])
+
+
+def _is_project_frame(frame: traceback.FrameSummary) -> bool:
+    # "<frozen runpy>" などの実ファイルでないフレームは除く
+    if frame.filename.startswith("<"):
+        return False
+    filename = os.path.abspath(frame.filename)
+    return (
+        filename.startswith(str(ROOT_DIR) + os.sep)
+        and "site-packages" not in filename
+        and filename != _THIS_FILE
+        and frame.name != "<module>"
+    )
+
+
+def _describe(frame: traceback.FrameSummary) -> str:
+    path = os.path.relpath(frame.filename, ROOT_DIR)
+    return f"{path}:{frame.lineno} {frame.name}"
+
+
+def blocking_call_site(stack: traceback.StackSummary) -> tuple[str, str]:
+    """
+    スタックから (ハンドラー, 呼び出し箇所) を返す。
+    ハンドラーは実行中のタスク内（asyncioのフレームより内側）でプロジェクト内の最も外側の関数、
+    呼び出し箇所は最も内側の関数。プロジェクト内の関数がなければ最も内側のフレームを呼び出し箇所とする
+    """
+    start = 0
+    for index, frame in enumerate(stack):
+        if f"{os.sep}asyncio{os.sep}" in frame.filename:
+            start = index + 1
+    project = [frame for frame in stack[start:] if _is_project_frame(frame)]
+    if not project:
+        innermost = stack[-1] if stack else None
+        site = f"{innermost.filename}:{innermost.lineno} {innermost.name}" if innermost else "unknown"
+        return "unknown", site
+    return project[0].name, _describe(project[-1])
+
+
+class LoopMonitor:
+    """イベントループの遅延を計測し、ループを止めている呼び出しを検出する"""
+
+    DEFAULT_INTERVAL_MS = 100  # 遅延を計測する間隔
+    DEFAULT_THRESHOLD_MS = 250  # この時間以上ループが進まなければスタックを取得する
+
+    def __init__(
+        self,
+        interval_ms: float | None = None,
+        threshold_ms: float | None = None,
+        enabled: bool | None = None,
+    ):
+        self.enabled = (
+            enabled if enabled is not None else os.getenv('LOOP_MONITOR', 'true').lower() == 'true')
+        self.interval = float(
+            interval_ms if interval_ms is not None
+            else os.getenv('LOOP_MONITOR_INTERVAL_MS', self.DEFAULT_INTERVAL_MS)) / 1000
+        self.threshold = float(
+            threshold_ms if threshold_ms is not None
+            else os.getenv('LOOP_LAG_THRESHOLD_MS', self.DEFAULT_THRESHOLD_MS)) / 1000
+        self.max_lag = 0.0
+        # (ハンドラー, 呼び出し箇所) ごとの検出回数。監視スレッドから更新するためロックで守る
+        self._sites: Counter[tuple[str, str]] = Counter()
+        self._lock = threading.Lock()
+        self._heartbeat = time.perf_counter()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def blocking_sites(self, limit: int | None = None) -> list[tuple[tuple[str, str], int]]:
+        """ループを止めていた (ハンドラー, 呼び出し箇所) を回数の多い順に返す"""
+        with self._lock:
+            return self._sites.most_common(limit)
+
+    def start(self) -> None:
+        """実行中のイベントループで監視を開始する"""
+        if not self.enabled or self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._measure())
+        self._thread = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"[loop] monitor started interval={self.interval * 1000:.0f}ms "
+            f"threshold={self.threshold * 1000:.0f}ms")
+
+    async def close(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+        top = self.blocking_sites(5)
+        if top:
+            summary = ", ".join(f"{handler} → {site} ×{count}" for (handler, site), count in top)
+            logger.info(f"[loop] blocking call sites: {summary}")
+
+    async def _measure(self) -> None:
+        while True:
+            started = time.perf_counter()
+            self._heartbeat = started
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            _LAG_SECONDS.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                logger.warning(f"[loop] event loop lag {lag * 1000:.0f}ms")
+
+    def _watch(self) -> None:
+        """監視スレッド。ループが止まっている間に1回だけメインスレッドのスタックを取得する"""
+        captured_for = None
+        while not self._stopped.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            stalled = time.perf_counter() - heartbeat - self.interval
+            if stalled < self.threshold or captured_for == heartbeat:
+                continue
+            captured_for = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            del frame
+            handler, site = blocking_call_site(stack)
+            with self._lock:
+                self._sites[(handler, site)] += 1
+            try:
+                # メトリクスはループのスレッドからだけ更新する
+                self._loop.call_soon_threadsafe(partial(_BLOCKED.inc, handler=handler, site=site))
+            except RuntimeError:
+                # ループが既に閉じている
+                return
+            logger.warning(
+                f"[loop] event loop blocked for {stalled * 1000:.0f}ms+ in {handler} at {site}\n"
+                + "".join(traceback.format_list(stack[-8:])).rstrip())
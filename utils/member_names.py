@@ -0,0 +1,129 @@
+"""
+メンバーの表示名の取得
+
+intentsを最小限にするとメンバー一覧をキャッシュしないため、guild.get_memberではほとんどのメンバーが見つかりません。
+一覧の表示に必要な表示名だけを有効期限付きLRUキャッシュに持ち、足りない分は一覧ごとにまとめて取得します
+（Gatewayのメンバー要求。user_ids指定ならmembers intentは不要。100人を超える分は同時に要求し、全体で期限を設けます）。
+メモリ使用量はサーバーの総メンバー数ではなく、キャッシュの上限で決まります。
+"""
+import asyncio
+import os
+from typing import Iterable
+
+import discord
+
+from utils import metrics
+from utils.logger import setup_logger
+from utils.ttl_cache import TTLCache
+
+logger = setup_logger(__name__)
+
+_LOOKUPS = metrics.counter("member_name_lookups_total", "表示名の取得件数（取得元ごと）", ["source"])
+
+# 1回のメンバー要求で指定できるユーザー数の上限
+QUERY_LIMIT = 100
+
+
+def mention(user_id: int) -> str:
+    """表示名が取得できなかった場合の表記"""
+    return f"<@{user_id}>"
+
+
+class MemberNameCache:
+    """(サーバー, ユーザー) ごとの表示名を有効期限付きLRUキャッシュで保持する"""
+
+    DEFAULT_MAXSIZE = 4096  # 保持する表示名の件数の上限
+    DEFAULT_TTL = 3600  # 表示名の有効期限（秒）。ニックネームの変更はこの時間で反映される
+    DEFAULT_TIMEOUT = 2.0  # メンバー要求の応答を待つ時間（秒）。インタラクションの応答期限より短くする
+
+    def __init__(self, maxsize: int | None = None, ttl: float | None = None, timeout: float | None = None):
+        """
+        Args:
+            maxsize: 保持する表示名の件数の上限（既定: MEMBER_NAME_CACHE_SIZE）
+            ttl: 表示名の有効期限（秒）（既定: MEMBER_NAME_CACHE_TTL）
+            timeout: メンバー要求の応答を待つ時間（秒）
+        """
+        self._cache = TTLCache(
+            maxsize=int(maxsize if maxsize is not None
+                        else os.getenv('MEMBER_NAME_CACHE_SIZE', self.DEFAULT_MAXSIZE)),
+            ttl=float(ttl if ttl is not None else os.getenv('MEMBER_NAME_CACHE_TTL', self.DEFAULT_TTL)),
+        )
+        self.timeout = timeout if timeout is not None else self.DEFAULT_TIMEOUT
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def remember(self, member: discord.Member) -> None:
+        """メッセージやインタラクションで受け取ったメンバーの表示名を記録する"""
+        self._cache.set((member.guild.id, member.id), member.display_name)
+
+    async def display_names(self, guild: discord.Guild, user_ids: Iterable[int]) -> dict[int, str]:
+        """
+        user_idsの表示名を返す。キャッシュにない分はまとめて取得し、
+        サーバーにいないユーザーや取得に失敗したユーザーはメンション表記にする
+        """
+        names: dict[int, str] = {}
+        missing: list[int] = []
+        for user_id in dict.fromkeys(user_ids):
+            name = self._cache.get((guild.id, user_id))
+            if name is None:
+                member = guild.get_member(user_id)
+                if member is not None:
+                    name = member.display_name
+                    self._cache.set((guild.id, user_id), name)
+            if name is None:
+                missing.append(user_id)
+            else:
+                names[user_id] = name
+                _LOOKUPS.inc(source="cache")
+
+        if missing:
+            chunks = [missing[start:start + QUERY_LIMIT] for start in range(0, len(missing), QUERY_LIMIT)]
+            for chunk, members in zip(chunks, await self._query_all(guild, chunks)):
+                if members is None:
+                    # 取得に失敗した分はキャッシュせず、次の一覧で取得し直す
+                    continue
+                for member in members:
+                    names[member.id] = member.display_name
+                    self._cache.set((guild.id, member.id), member.display_name)
+                    _LOOKUPS.inc(source="fetched")
+                for user_id in chunk:
+                    if user_id not in names:
+                        # サーバーにいないユーザー。毎回問い合わせないよう、メンション表記をキャッシュする
+                        self._cache.set((guild.id, user_id), mention(user_id))
+
+        for user_id in missing:
+            if user_id not in names:
+                names[user_id] = mention(user_id)
+                _LOOKUPS.inc(source="missing")
+        return names
+
+    async def display_name(self, guild: discord.Guild, user_id: int) -> str:
+        return (await self.display_names(guild, [user_id]))[user_id]
+
+    async def _query_all(
+        self, guild: discord.Guild, chunks: list[list[int]]
+    ) -> list[list[discord.Member] | None]:
+        """
+        各チャンクのメンバー要求を同時に送り、全体でtimeout秒だけ待つ。
+        時間内に応答がなかった・失敗したチャンクはNoneを返す
+        """
+        tasks = [
+            asyncio.create_task(guild.query_members(user_ids=chunk, limit=len(chunk), cache=False))
+            for chunk in chunks
+        ]
+        _, pending = await asyncio.wait(tasks, timeout=self.timeout)
+        for task in pending:
+            task.cancel()
+        results = []
+        for chunk, task in zip(chunks, tasks):
+            if task in pending:
+                logger.warning(f"[members] メンバーの取得がタイムアウト guild={guild.id} count={len(chunk)}")
+                results.append(None)
+            elif task.exception() is not None:
+                e = task.exception()
+                logger.warning(f"[members] メンバーの取得に失敗 guild={guild.id} count={len(chunk)}: {e!r}")
+                results.append(None)
+            else:
+                results.append(task.result())
+        return results
@@ -0,0 +1,240 @@
+"""
+メトリクスの収集と公開
+
+コマンド・AI API・SQLite・Discordへの送信などの所要時間（ヒストグラム）と件数（カウンター）を集計し、
+Prometheusのテキスト形式で公開します。公開用のHTTPサーバーはBotと同じイベントループで動かします。
+
+メトリクスはすべてイベントループのスレッドから記録する前提のため、ロックは取りません。
+
+Usage:
+    REQUESTS = metrics.counter("ai_requests_total", "AI APIの呼び出し回数", ["provider", "status"])
+    LATENCY = metrics.histogram("ai_request_seconds", "AI APIの応答時間", ["provider"])
+
+    with LATENCY.time(provider="grok"):
+        ...
+    REQUESTS.inc(provider="grok", status="ok")
+"""
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from aiohttp import web
+
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 既定のバケット（秒）。SQLiteの1ms未満からAI APIの数十秒までを区別できるようにする
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: list[str] | tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict[str, object]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: labels {sorted(labels)} != {sorted(self.labelnames)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """単調増加する件数"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: list[str] | tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """所要時間などの分布。バケットごとの累積件数と合計を持つ"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: list[str] | tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # ラベルの値ごとに [各バケットの件数（累積ではない）, 合計]
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = ([0] * len(self.buckets), [0.0])
+            self._series[key] = series
+        counts, total = series
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        total[0] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """ブロックの所要時間を記録する（例外で抜けた場合も記録する）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """メトリクスの一覧。render()でPrometheusのテキスト形式に出力する"""
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            # モジュールの再読み込みなどで同じ名前が登録された場合は既存のものを使う
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"metric {metric.name} is already registered with a different type or labels")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: list[str] | tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: list[str] | tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# プロジェクト全体で共有するレジストリ
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+
+# Discordへの送信はリマインダー・川柳の返信・ストリーミング応答など複数の機能から記録するため、ここで定義する
+DISCORD_SEND_SECONDS = histogram(
+    "discord_send_seconds", "Discordへのメッセージ送信・編集の所要時間", ["kind"])
+
+
+class MetricsServer:
+    """/metrics でメトリクスを返すHTTPサーバー"""
+
+    DEFAULT_HOST = "127.0.0.1"
+
+    def __init__(self, registry: Registry = REGISTRY, host: str | None = None, port: int | None = None):
+        """
+        Args:
+            host: 待ち受けるアドレス（既定: METRICS_HOST または 127.0.0.1）
+            port: 待ち受けるポート（既定: METRICS_PORT。未設定ならサーバーを起動しない）
+        """
+        self.registry = registry
+        self.host = host or os.getenv('METRICS_HOST', self.DEFAULT_HOST)
+        if port is None and os.getenv('METRICS_PORT'):
+            port = int(os.getenv('METRICS_PORT'))
+        self.port = port
+        self._runner: web.AppRunner | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.port is not None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.registry.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    async def start(self) -> None:
+        """サーバーを起動する。ポートが設定されていなければ何もしない"""
+        if not self.enabled or self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, self.host, self.port)
+        await site.start()
+        self._runner = runner
+        # port=0を指定した場合に実際のポートを記録する
+        self.port = runner.addresses[0][1]
+        logger.info(f"[metrics] listening on http://{self.host}:{self.port}/metrics")
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
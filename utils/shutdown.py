@@ -0,0 +1,38 @@
+"""
+シグナルによる終了処理
+
+discord.pyのClient.runはKeyboardInterrupt（SIGINT）しか扱わないため、
+docker stopなどのSIGTERMではclose()が呼ばれず、write-behindでたまっている登録などが失われます。
+SIGTERMを受けたらイベントループ上でclose()を実行し、通常の終了処理を通すようにします。
+"""
+import asyncio
+import signal
+from typing import Awaitable, Callable
+
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def install_shutdown_handler(
+    close: Callable[[], Awaitable[None]], signals: tuple[int, ...] = (signal.SIGTERM,)
+) -> None:
+    """
+    実行中のイベントループに、signalsを受けたらclose()を実行するハンドラーを登録する。
+    シグナルハンドラーを使えない環境（Windowsなど）では何もしない
+    """
+    loop = asyncio.get_running_loop()
+    tasks: set[asyncio.Task] = set()
+
+    def handle(signum: int) -> None:
+        logger.info(f"[shutdown] received {signal.Signals(signum).name}")
+        # 実行中のタスクへの参照を保持し、終了処理の途中で回収されないようにする
+        task = loop.create_task(close())
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    for signum in signals:
+        try:
+            loop.add_signal_handler(signum, handle, signum)
+        except (NotImplementedError, RuntimeError):
+            logger.warning(f"[shutdown] cannot handle {signal.Signals(signum).name} on this platform")
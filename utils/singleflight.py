@@ -0,0 +1,39 @@
+"""
+同一リクエストの合流（single-flight）
+
+同じキーの処理が実行中なら新たに実行せず、実行中の処理の結果を待つようにします。
+話題のキーワードで/searchや/imageが同時に何度も実行されても、外部APIへのリクエストは1回で済みます。
+結果や例外は待っていた全員に返しますが、完了後は保持しません（キャッシュはしない）。
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """キーごとに実行中の処理を1つにまとめる"""
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.coalesced = 0  # 実行中の処理に合流した回数
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        keyの処理が実行中ならその結果を待ち、なければfuncを実行して結果を返す。
+        funcが例外を送出した場合は、待っていた全員に同じ例外が送出される。
+        """
+        task = self._inflight.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        # 待っている1人がキャンセルされても、他の待ち手のために処理自体は続ける
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
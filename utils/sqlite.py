@@ -0,0 +1,162 @@
+"""
+SQLiteの接続管理
+
+ストアのメソッドごとにaiosqlite.connect()すると、そのたびに接続用スレッドの起動とファイルのオープンが走ります。
+DBファイルごとに接続を1本だけ開いたまま使い回し、WALモードで書き込み時のfsyncを減らします。
+
+スキーマは PRAGMA user_version で版を管理し、Database.migrate() で未適用のマイグレーションだけを順に適用します。
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Sequence
+
+import aiosqlite
+
+from utils import metrics
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_QUERY_SECONDS = metrics.histogram(
+    "sqlite_query_seconds", "SQLiteのトランザクション・読み取りの所要時間（ロック待ちを除く）", ["database", "op"])
+_QUERY_ERRORS = metrics.counter(
+    "sqlite_errors_total", "ロールバックしたSQLiteのトランザクション数", ["database", "op"])
+
+# マイグレーション。リストのi番目（0始まり）を適用するとuser_versionがi+1になる
+Migration = Callable[[aiosqlite.Connection], Awaitable[None]]
+
+
+def to_epoch_ms(value: datetime) -> int:
+    """aware datetimeをUNIX時間（ミリ秒）に変換する"""
+    return round(value.timestamp() * 1000)
+
+
+def from_epoch_ms(value: int) -> datetime:
+    """UNIX時間（ミリ秒）をUTCのaware datetimeに変換する"""
+    return datetime.fromtimestamp(value / 1000, timezone.utc)
+
+
+def sql_iso_to_epoch_ms(column: str) -> str:
+    """ISO 8601文字列の列をUNIX時間（ミリ秒）に変換するSQL式（既存データのマイグレーション用）"""
+    return f"CAST(ROUND((julianday({column}) - 2440587.5) * 86400000) AS INTEGER)"
+
+
+class Database:
+    """1つのDBファイルに対する長寿命の接続"""
+
+    DEFAULT_SYNCHRONOUS = "NORMAL"  # WALではNORMALでもコミット済みのデータは壊れない（電源断で直近のコミットが失われうるだけ）
+    DEFAULT_CACHED_STATEMENTS = 256  # 接続ごとに再利用するプリペアドステートメント数
+    DEFAULT_BUSY_TIMEOUT_MS = 5000
+
+    def __init__(
+        self,
+        path: Path,
+        synchronous: str | None = None,
+        cached_statements: int | None = None,
+    ):
+        self.path = Path(path)
+        self.synchronous = synchronous or os.getenv('SQLITE_SYNCHRONOUS', self.DEFAULT_SYNCHRONOUS)
+        self.cached_statements = int(
+            cached_statements if cached_statements is not None
+            else os.getenv('SQLITE_CACHED_STATEMENTS', self.DEFAULT_CACHED_STATEMENTS))
+        self._conn: aiosqlite.Connection | None = None
+        # 接続は1本なので、トランザクションが他のコルーチンの書き込みと混ざらないよう順番に使う
+        self._lock = asyncio.Lock()
+
+    async def _connect(self) -> aiosqlite.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = await aiosqlite.connect(self.path, cached_statements=self.cached_statements)
+            conn.row_factory = aiosqlite.Row
+            await conn.execute("PRAGMA journal_mode=WAL")
+            await conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            await conn.execute(f"PRAGMA busy_timeout={self.DEFAULT_BUSY_TIMEOUT_MS}")
+            await conn.execute("PRAGMA foreign_keys=ON")
+            self._conn = conn
+            logger.debug(f"[sqlite] opened {self.path.name} synchronous={self.synchronous}")
+        return self._conn
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        書き込み用。ブロックを抜けるとコミットし、例外ならロールバックする
+
+        Usage:
+            async with database.transaction() as db:
+                await db.execute(...)
+        """
+        async with self._lock:
+            with _QUERY_SECONDS.time(database=self.path.name, op="transaction"):
+                conn = await self._connect()
+                try:
+                    yield conn
+                except BaseException:
+                    _QUERY_ERRORS.inc(database=self.path.name, op="transaction")
+                    await conn.rollback()
+                    raise
+                await conn.commit()
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """読み取り用。コミットはしない"""
+        async with self._lock:
+            with _QUERY_SECONDS.time(database=self.path.name, op="read"):
+                yield await self._connect()
+
+    async def migrate(self, migrations: Sequence[Migration]) -> int:
+        """
+        未適用のマイグレーションを1つずつトランザクション内で適用し、適用後のスキーマの版を返す。
+        途中で失敗した場合、そのマイグレーションはロールバックされ、版はその直前のまま残る。
+        """
+        async with self._lock:
+            conn = await self._connect()
+            cursor = await conn.execute("PRAGMA user_version")
+            version = (await cursor.fetchone())[0]
+            if version > len(migrations):
+                raise RuntimeError(
+                    f"{self.path.name}: schema version {version} is newer than this code ({len(migrations)})")
+            for number in range(version + 1, len(migrations) + 1):
+                # DDLでは暗黙のトランザクションが始まらないため、明示的にBEGINする
+                await conn.execute("BEGIN")
+                try:
+                    await migrations[number - 1](conn)
+                    await conn.execute(f"PRAGMA user_version={number}")
+                except BaseException:
+                    await conn.rollback()
+                    raise
+                await conn.commit()
+                logger.info(f"[sqlite] migrated {self.path.name} to version {number}")
+            return len(migrations)
+
+    async def close(self) -> None:
+        async with self._lock:
+            if self._conn is not None:
+                await self._conn.close()
+                self._conn = None
+
+
+class DatabaseManager:
+    """DBファイルごとのDatabaseを共有し、終了時にまとめて閉じる"""
+
+    def __init__(self):
+        self._databases: dict[Path, Database] = {}
+
+    def get(self, path: Path) -> Database:
+        """pathのDatabaseを返す。同じファイルを指すストアは同じ接続を使う"""
+        key = Path(path).resolve()
+        database = self._databases.get(key)
+        if database is None:
+            database = Database(key)
+            self._databases[key] = database
+        return database
+
+    async def close_all(self) -> None:
+        for database in self._databases.values():
+            try:
+                await database.close()
+            except Exception as e:
+                logger.error(f"[sqlite] close failed {database.path}: {type(e).__name__}: {e}")
+        self._databases.clear()
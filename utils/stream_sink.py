@@ -0,0 +1,121 @@
+"""
+ストリーミング応答をDiscordのメッセージに逐次反映するモジュール
+
+応答の差分を受け取るたびに編集するとレート制限にかかるため、一定間隔ごとにまとめて編集します。
+間隔内に届いた差分は、次の差分を待たずにタイマーで反映します（生成が途中で止まっても表示が遅れないようにする）。
+1メッセージの文字数上限（2000文字）を超えた分は続きのメッセージとして送信します。
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+import discord
+
+from utils.metrics import DISCORD_SEND_SECONDS
+
+DISCORD_MAX_LENGTH = 2000
+
+
+def paginate(text: str, max_length: int = DISCORD_MAX_LENGTH) -> list[str]:
+    """テキストをmax_length文字ごとに分割する。テキストが伸びても確定済みのページは変わらない"""
+    return [text[i:i + max_length] for i in range(0, len(text), max_length)]
+
+
+class DiscordStreamSink:
+    """ストリーミング応答を、間隔を空けたメッセージ編集でDiscordに表示する"""
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[discord.Message]],
+        header: str = "",
+        interval: float = 1.0,
+        max_length: int = DISCORD_MAX_LENGTH,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            send: 新しいメッセージを送信し、そのMessageを返す関数（followup.send(wait=True)やchannel.send）
+            header: 1通目の先頭に付ける文字列（/talkの引用など）
+            interval: メッセージを編集する最短間隔（秒）
+        """
+        self._send = send
+        self._header = header
+        self._interval = interval
+        self._max_length = max_length
+        self._clock = clock
+        self._text = ""
+        self._messages: list[discord.Message] = []
+        self._shown: list[str] = []  # 各メッセージに現在表示している内容
+        self._started = clock()
+        self._last_flush = None
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+        self._error: discord.HTTPException | None = None  # タイマーでの反映に失敗した場合の例外
+        self.first_visible_latency: float | None = None  # 最初の応答テキストが表示されるまでの秒数
+
+    @property
+    def text(self) -> str:
+        """これまでに受け取った応答テキスト"""
+        return self._text
+
+    async def write(self, delta: str) -> None:
+        """
+        応答の差分を追加する。前回の反映からinterval秒以上経っていればDiscordに反映し、
+        そうでなければ間隔が空いた時点でタイマーで反映する
+        """
+        self._raise_error()
+        self._text += delta
+        now = self._clock()
+        if self._last_flush is None or now - self._last_flush >= self._interval:
+            await self.flush()
+        elif self._timer is None:
+            delay = self._interval - (now - self._last_flush)
+            self._timer = asyncio.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._timer = None
+        try:
+            await self.flush()
+        except discord.HTTPException as e:
+            # バックグラウンドでは送出先がないため、次のwrite()・close()で送出する
+            self._error = e
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    async def flush(self) -> None:
+        """受け取った応答をDiscordに反映する。あふれた分は続きのメッセージとして送信する"""
+        async with self._lock:
+            if not self._text:
+                return
+            self._last_flush = self._clock()
+
+            pages = paginate(self._header + self._text, self._max_length)
+            for index, page in enumerate(pages):
+                if index < len(self._messages):
+                    if self._shown[index] != page:
+                        with DISCORD_SEND_SECONDS.time(kind="stream_edit"):
+                            await self._messages[index].edit(content=page)
+                        self._shown[index] = page
+                else:
+                    with DISCORD_SEND_SECONDS.time(kind="stream_send"):
+                        self._messages.append(await self._send(page))
+                    self._shown.append(page)
+
+            if self.first_visible_latency is None:
+                self.first_visible_latency = self._clock() - self._started
+
+    def cancel(self) -> None:
+        """タイマーでの反映を止める（応答が途中で失敗した場合など）"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def close(self) -> None:
+        """最後まで受け取った応答を反映する"""
+        self.cancel()
+        self._raise_error()
+        await self.flush()
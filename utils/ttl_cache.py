@@ -0,0 +1,59 @@
+"""
+有効期限付きLRUキャッシュ
+
+件数の上限を超えると最も長く使われていない項目から捨て、有効期限を過ぎた項目は取得時に捨てます。
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+_MISSING = object()
+
+class TTLCache:
+    """有効期限（TTL）付きのLRUキャッシュ"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 3600.0, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            maxsize: 保持する項目数の上限
+            ttl: 項目の有効期限（秒）の既定値
+            clock: 現在時刻を返す関数
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._items: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """有効な項目があれば返す。なければdefaultを返す"""
+        item = self._items.get(key)
+        if item is None:
+            return default
+        value, expires_at = item
+        if expires_at <= self._clock():
+            del self._items[key]
+            return default
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """項目を登録する。ttlを省略すると既定の有効期限を使う"""
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        self._items[key] = (value, expires_at)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._items.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self) -> None:
+        self._items.clear()
+